@@ -0,0 +1,170 @@
+import math
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from .result_models import BenchmarkRun, QueryMetric, RegressionEvent
+
+# This file detects per-query slowdowns across BenchmarkRun history.
+# Each new run is compared against a window of earlier runs with the same
+# (db_type, scale_factor, layout, streams); runs are marked once processed so a nightly job
+# only ever looks at runs it has not seen before.
+
+
+# MAD of a normal sample times this estimates its standard deviation
+MAD_TO_SIGMA = 1.4826
+
+# key of a comparable series: one query under one cache state and variant
+SeriesKey = Tuple[int, Optional[str], Optional[str]]
+
+
+def robust_slowdown(history: np.ndarray, current: np.ndarray) -> tuple:
+    """
+    Tests whether `current` is slower than the distribution of `history`.
+
+    Returns (relative_change, p_value) where relative_change is
+    median(current) / median(history) - 1 and p_value is the one-sided
+    normal tail of the robust z-score of median(current), i.e. its distance
+    from median(history) in units of the history's scaled MAD. Unlike a
+    resampling test this has power with a single current value, which is
+    what a single-stream run produces. The MAD is floored at 1% of the
+    baseline so a perfectly steady history does not flag noise.
+    """
+    baseline = np.median(history)
+    observed = np.median(current)
+    scale = max(MAD_TO_SIGMA * np.median(np.abs(history - baseline)), 0.01 * baseline)
+    z = (observed - baseline) / scale
+    p_value = 0.5 * math.erfc(z / math.sqrt(2.0))
+    return float(observed / baseline - 1.0), float(p_value)
+
+
+def _query_times(session: Session, job_ids: List[uuid.UUID]) -> Dict[SeriesKey, Dict[uuid.UUID, List[float]]]:
+    """
+    Loads execution times of completed queries for the given runs as
+    {(query_number, cache_state, variant): {job_id: [times]}}, so cold runs
+    are only compared with cold history and mixed with mixed.
+    Timeouts and queries skipped by a run budget are left out.
+    """
+    rows = session.exec(
+        select(
+            QueryMetric.job_id,
+            QueryMetric.query_number,
+            QueryMetric.cache_state,
+            QueryMetric.variant,
+            QueryMetric.execution_time_seconds,
+        )
+        .where(
+            QueryMetric.job_id.in_(job_ids),
+            QueryMetric.status == "ok",
+            QueryMetric.execution_time_seconds > 0,
+        )
+    ).all()
+    times: Dict[SeriesKey, Dict[uuid.UUID, List[float]]] = defaultdict(lambda: defaultdict(list))
+    for job_id, query_number, cache_state, variant, seconds in rows:
+        times[(query_number, cache_state, variant)][job_id].append(seconds)
+    return times
+
+
+def detect_regressions(
+    session: Session,
+    run: BenchmarkRun,
+    window: int = 20,
+    min_history: int = 5,
+    threshold: float = 0.10,
+    alpha: float = 0.01,
+) -> List[RegressionEvent]:
+    """
+    Compares one completed run against the `window` most recent earlier runs
+    with the same db_type, scale_factor, layout and number of streams (a
+    query runs slower next to concurrent streams) and returns a
+    RegressionEvent for every (query, cache state, variant) that is at least
+    `threshold` slower with p < alpha.
+    The events are added to the session but not committed.
+    """
+    history_ids = session.exec(
+        select(BenchmarkRun.job_id)
+        .where(
+            BenchmarkRun.db_type == run.db_type,
+            BenchmarkRun.scale_factor == run.scale_factor,
+            BenchmarkRun.layout == run.layout,
+            BenchmarkRun.streams == run.streams,
+            BenchmarkRun.status == "completed",
+            BenchmarkRun.completed_at < run.completed_at,
+        )
+        .order_by(BenchmarkRun.completed_at.desc())
+        .limit(window)
+    ).all()
+    if len(history_ids) < min_history:
+        return []
+
+    times = _query_times(session, [run.job_id, *history_ids])
+    events = []
+    for (query_number, cache_state, variant), per_run in sorted(times.items(), key=lambda item: item[0][0]):
+        current = np.asarray(per_run.pop(run.job_id, []), dtype=float)
+        if current.size == 0 or len(per_run) < min_history:
+            continue
+        # one value per earlier run so runs with more streams don't dominate
+        history = np.array([np.median(values) for values in per_run.values()], dtype=float)
+
+        change, p_value = robust_slowdown(history, current)
+        if change >= threshold and p_value < alpha:
+            event = RegressionEvent(
+                job_id=run.job_id,
+                db_type=run.db_type,
+                scale_factor=run.scale_factor,
+                query_number=query_number,
+                cache_state=cache_state,
+                variant=variant,
+                baseline_seconds=float(np.median(history)),
+                current_seconds=float(np.median(current)),
+                relative_change=change,
+                p_value=p_value,
+                history_runs=history.size,
+            )
+            session.add(event)
+            events.append(event)
+    return events
+
+
+def detect_new_regressions(session: Session, **kwargs) -> List[RegressionEvent]:
+    """
+    Runs detection for every completed run that has not been checked yet,
+    oldest first, and marks those runs as checked. Commits the session.
+    """
+    pending = session.exec(
+        select(BenchmarkRun)
+        .where(BenchmarkRun.status == "completed", BenchmarkRun.regressions_checked_at.is_(None))
+        .order_by(BenchmarkRun.completed_at)
+    ).all()
+
+    events = []
+    for run in pending:
+        events.extend(detect_regressions(session, run, **kwargs))
+        run.regressions_checked_at = datetime.utcnow()
+        session.add(run)
+    session.commit()
+    return events
+
+
+def list_regressions(
+    session: Session,
+    db_type: Optional[str] = None,
+    scale_factor: Optional[int] = None,
+    query_number: Optional[int] = None,
+    limit: int = 100,
+) -> List[RegressionEvent]:
+    """
+    Returns the most recent regression events, optionally filtered.
+    """
+    statement = select(RegressionEvent)
+    if db_type is not None:
+        statement = statement.where(RegressionEvent.db_type == db_type)
+    if scale_factor is not None:
+        statement = statement.where(RegressionEvent.scale_factor == scale_factor)
+    if query_number is not None:
+        statement = statement.where(RegressionEvent.query_number == query_number)
+    return session.exec(statement.order_by(RegressionEvent.detected_at.desc()).limit(limit)).all()
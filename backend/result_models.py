@@ -1,21 +1,32 @@
-from sqlmodel import Field, SQLModel, Relationship
-from typing import List, Optional
+from sqlmodel import Field, SQLModel, Relationship, create_engine
+from typing import TYPE_CHECKING, List, Optional
 from datetime import datetime
+import os
 import uuid
 
+if TYPE_CHECKING:
+    import datafruit as dft
+
 class BenchmarkRun(SQLModel, table = True):
     job_id: uuid.UUID = Field(default=uuid.uuid4, primary_key = True, description = "ID for benchmark job")
 
     db_type: str = Field(index = True, description = "Type of DB benchmarked")
     scale_factor: int = Field(description = "TPC-H scale factor")
+    streams: int = Field(default=1, description="number of concurrent query streams")
+    layout: str = Field(default="heap", description="physical layout of lineitem/orders (heap, range_date, hash_orderkey)")
+    sweep_id: Optional[uuid.UUID] = Field(default=None, index=True, description="scale-factor sweep this run is part of")
     status: str = Field(index = True, default = "pending", description = "current status of job")
 
     # specific metrics from HammerDB
     power_score: Optional[float] = Field(description = "gemoetric mean of the query times")
     throughput_score: Optional[float] = Field(description = "queries per hour")
+    harness_overhead_seconds: Optional[float] = Field(default=None, description="wall time spent in the harness rather than in the database")
+    oltp_slowdown_factor: Optional[float] = Field(default=None, description="geometric mean slowdown of the queries under concurrent OLTP load")
+    max_sustainable_qps: Optional[float] = Field(default=None, description="highest open-loop query rate the target sustained")
 
     created_at: datetime = Field(default_factory=datetime.utcnow, description="when the job was created")
     completed_at: Optional[datetime] = Field(default=None, description="when the job finished")
+    regressions_checked_at: Optional[datetime] = Field(default=None, index=True, description="when regression detection last processed this run")
 
     # backfills relations for individual queries
     query_metrics: List["QueryMetric"] = Relationship(back_populates="benchmark_run")
@@ -26,16 +37,105 @@ class QueryMetric(SQLModel, table=True):
     job_id: uuid.UUID = Field(foreign_key="benchmarkrun.job_id", description="The job this metric belongs to")
     query_number: int = Field(description="The TPC-H query number (1-22)")
     execution_time_seconds: float = Field(description="Time taken to execute the query in seconds")
+    stream: Optional[int] = Field(default=None, description="Query stream the execution belonged to")
+    started_at: Optional[datetime] = Field(default=None, description="Wall-clock start of the execution (UTC)")
+    rows_returned: Optional[int] = Field(default=None, description="Number of rows the query returned")
+    status: str = Field(default="ok", index=True, description="ok, timeout, error, or skipped when the run's time budget ran out")
+    variant: Optional[str] = Field(default=None, index=True, description="Condition the stream ran under when a run compares several (e.g. olap vs mixed)")
+    cache_state: Optional[str] = Field(default=None, index=True, description="Buffer/page cache state the query ran under (cold, cold_partial or warm)")
+
+    # server-side resource deltas captured by the resource sampler, None when
+    # they could not be attributed to this query
+    blocks_read: Optional[int] = Field(default=None, description="Shared blocks read from disk/OS cache")
+    blocks_hit: Optional[int] = Field(default=None, description="Shared blocks found in Postgres buffers")
+    temp_bytes: Optional[int] = Field(default=None, description="Bytes spilled to temporary files")
+    cpu_seconds: Optional[float] = Field(default=None, description="CPU seconds used by the database backends (local instances only)")
+    wal_bytes: Optional[int] = Field(default=None, description="WAL bytes generated while the query ran")
 
     # backfill relationship back to the parent run
     benchmark_run: Optional[BenchmarkRun] = Relationship(back_populates="query_metrics")
 
+class RegressionEvent(SQLModel, table=True):
+    event_id: Optional[int] = Field(default=None, primary_key=True)
+
+    job_id: uuid.UUID = Field(foreign_key="benchmarkrun.job_id", index=True, description="The run in which the regression was detected")
+    db_type: str = Field(index=True, description="Type of DB benchmarked")
+    scale_factor: int = Field(index=True, description="TPC-H scale factor")
+    query_number: int = Field(index=True, description="The TPC-H query number (1-22)")
+    cache_state: Optional[str] = Field(default=None, description="Cache state of the compared executions")
+    variant: Optional[str] = Field(default=None, description="Variant of the compared executions (e.g. olap or mixed)")
+
+    baseline_seconds: float = Field(description="Median execution time over the history window")
+    current_seconds: float = Field(description="Median execution time in the new run")
+    relative_change: float = Field(description="current / baseline - 1")
+    p_value: float = Field(description="One-sided p-value of the robust z-test for the slowdown")
+    history_runs: int = Field(description="Number of earlier runs the baseline was built from")
+
+    detected_at: datetime = Field(default_factory=datetime.utcnow, description="when the event was recorded")
+
+class OltpLatency(SQLModel, table=True):
+    latency_id: Optional[int] = Field(default=None, primary_key=True)
+
+    job_id: uuid.UUID = Field(foreign_key="benchmarkrun.job_id", index=True, description="The run the OLTP traffic belonged to")
+    operation: str = Field(description="insert, update or lookup")
+    target_rate: float = Field(description="Requested operations per second")
+    count: int = Field(description="Operations completed")
+    errors: int = Field(default=0, description="Operations that failed")
+    p50_ms: Optional[float] = Field(default=None, description="Median latency in milliseconds")
+    p95_ms: Optional[float] = Field(default=None, description="95th percentile latency in milliseconds")
+    p99_ms: Optional[float] = Field(default=None, description="99th percentile latency in milliseconds")
+
+class LoadSweepPoint(SQLModel, table=True):
+    point_id: Optional[int] = Field(default=None, primary_key=True)
+
+    job_id: uuid.UUID = Field(foreign_key="benchmarkrun.job_id", index=True, description="The run this sweep belongs to")
+    target_qps: float = Field(description="Scheduled query arrival rate")
+    achieved_qps: float = Field(description="Completed queries per second")
+    issued: int = Field(description="Queries scheduled in the window")
+    completed: int = Field(description="Queries that completed")
+    timeouts: int = Field(default=0, description="Queries that timed out")
+    errors: int = Field(default=0, description="Queries that failed with an error")
+    p50_seconds: Optional[float] = Field(default=None, description="Median latency from intended start")
+    p95_seconds: Optional[float] = Field(default=None, description="95th percentile latency from intended start")
+    p99_seconds: Optional[float] = Field(default=None, description="99th percentile latency from intended start")
+    sustainable: bool = Field(description="Whether the target rate was sustained without growing latency")
+
+class ScalingFit(SQLModel, table=True):
+    fit_id: Optional[int] = Field(default=None, primary_key=True)
+
+    sweep_id: uuid.UUID = Field(index=True, description="The scale-factor sweep the fit was computed from")
+    db_type: str = Field(index=True, description="Type of DB benchmarked")
+    query_number: int = Field(description="The TPC-H query number (1-22)")
+    exponent: float = Field(description="k in time ~ SF^k")
+    r_squared: float = Field(description="Goodness of the log-log fit")
+    superlinear: bool = Field(index=True, description="Whether k exceeds the super-linear threshold")
+    min_scale_factor: int = Field(description="Smallest scale factor in the fit")
+    max_scale_factor: int = Field(description="Largest scale factor in the fit")
+
+class DesignExperiment(SQLModel, table=True):
+    experiment_id: Optional[int] = Field(default=None, primary_key=True)
+
+    job_id: uuid.UUID = Field(foreign_key="benchmarkrun.job_id", index=True, description="The run the experiment belongs to")
+    design_name: str = Field(index=True, description="Name of the candidate physical design")
+    affected_queries: str = Field(description="Comma-separated TPC-H query numbers that were rerun")
+    build_seconds: float = Field(description="Time to build the design")
+    size_bytes: int = Field(description="On-disk size of the relations the design created")
+    baseline_seconds: float = Field(description="Summed median time of the affected queries without the design")
+    design_seconds: float = Field(description="Summed median time of the affected queries with the design")
+    speedup: Optional[float] = Field(default=None, description="Geometric mean of per-query baseline / design time")
+    rank: Optional[int] = Field(default=None, description="Position among the designs tried in this run, 1 is best")
+
 RESULTS_DB_MODELS = [
     BenchmarkRun,
     QueryMetric,
+    RegressionEvent,
+    OltpLatency,
+    LoadSweepPoint,
+    ScalingFit,
+    DesignExperiment,
 ]
 
-def get_results_db_instance() -> dft.PostgresDB:
+def get_results_db_instance() -> "dft.PostgresDB":
     """
     Creates a datafruit.PostgresDB instance for the service
     results database. It reads the connection string from an environment
@@ -45,9 +145,23 @@ def get_results_db_instance() -> dft.PostgresDB:
     connection_string = os.getenv("RESULTS_DB_URL")
     if not connection_string:
         raise ValueError("RESULTS_DB_URL environment variable not set.")
-        
+
+    import datafruit as dft
+
     db = dft.PostgresDB(
         connection_string=connection_string,
         tables=RESULTS_DB_MODELS
     )
     return db
+
+def get_results_engine():
+    """
+    Creates a SQLAlchemy engine for the results database, for analysis code
+    that queries metric history through SQLModel sessions.
+    """
+
+    connection_string = os.getenv("RESULTS_DB_URL")
+    if not connection_string:
+        raise ValueError("RESULTS_DB_URL environment variable not set.")
+
+    return create_engine(connection_string, pool_pre_ping=True)
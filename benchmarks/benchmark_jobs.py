@@ -1,15 +1,26 @@
 import datafruit as dft
 import random 
 from datetime import date, timedelta
+from typing import TYPE_CHECKING, Iterator, Optional
 
 from .tpch_schema import get_tpch_db_instance, LineItem, Orders
-from .results_models import get_results_db_instance, QueryMetric
+from backend.result_models import get_results_db_instance, QueryMetric
 
-@dft.pyjob(output=LineItem, num_cpus=4)
-def generate_lineitem_date(row_number: int):
+if TYPE_CHECKING:
+    from .profiling import HarnessProfiler
 
-    start_date = date(2005, 1, 1)
-    end_date = date(2011, 12, 31)
+# profiler phase the generator calls are timed under
+GENERATE_PHASE = "generate"
+
+def lineitem_row(row_number: int) -> dict:
+    """
+    Builds one synthetic LineItem row. Kept outside the datafruit job so the
+    generator can be benchmarked on its own.
+    """
+    # TPC-H ship dates run from 1992-01-02 to 1998-12-01
+    start_date = date(1992, 1, 2)
+    end_date = date(1998, 12, 21)
+    random_days = random.randint(0, (end_date - start_date).days - 20)
 
     return {
         "l_orderkey": random.randint(1, 6000000),
@@ -30,6 +41,21 @@ def generate_lineitem_date(row_number: int):
         "l_comment": "xyz comment"
     }
 
+@dft.pyjob(output=LineItem, num_cpus=4)
+def generate_lineitem_date(row_number: int):
+    return lineitem_row(row_number)
+
+def generate_lineitem_rows(count: int, profiler: Optional["HarnessProfiler"] = None) -> Iterator[dict]:
+    """
+    Yields `count` LineItem rows from generate_lineitem_date. With a
+    profiler every call is timed as the "generate" phase.
+    """
+    generate = generate_lineitem_date
+    if profiler is not None:
+        generate = profiler.wrap(GENERATE_PHASE, generate)
+    for row_number in range(count):
+        yield generate(row_number)
+
 @dft.sql_job()
 def run_tpch_query_1(db_instance: dft.PostgresDB):
     """
@@ -838,4 +864,31 @@ def run_tpch_query_22(db_instance: dft.PostgresDB):
             cntrycode
         order by
             cntrycode;
-    """
\ No newline at end of file
+    """
+
+
+# query number -> job, used by the runner to execute streams
+TPCH_QUERY_JOBS = {
+    1: run_tpch_query_1,
+    2: run_tpch_query_2,
+    3: run_tpch_query_3,
+    4: run_tpch_query_4,
+    5: run_tpch_query_5,
+    6: run_tpch_query_6,
+    7: run_tpch_query_7,
+    8: run_tpch_query_8,
+    9: run_tpch_query_9,
+    10: run_tpch_query_10,
+    11: run_tpch_query_11,
+    12: run_tpch_query_12,
+    13: run_tpch_query_13,
+    14: run_tpch_query_14,
+    15: run_tpch_query_15,
+    16: run_tpch_query_16,
+    17: run_tpch_query_17,
+    18: run_tpch_query_18,
+    19: run_tpch_query_19,
+    20: run_tpch_query_20,
+    21: run_tpch_query_21,
+    22: run_tpch_query_22,
+}
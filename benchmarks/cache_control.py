@@ -0,0 +1,156 @@
+import logging
+import os
+import shlex
+import subprocess
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from sqlmodel import text
+
+from .tpch_schema import TPCH_MODELS, get_tpch_engine
+
+# This file controls the cache state a benchmark stream runs under.
+# "cold" empties both the Postgres shared buffers (by restarting the server)
+# and the OS page cache, "warm" loads every TPC-H table into shared buffers
+# with pg_prewarm before the stream starts. When a cold state can only be
+# reached partially (remote target, no restart command, no root for the page
+# cache) the queries are tagged "cold_partial" instead of "cold".
+
+logger = logging.getLogger(__name__)
+
+COLD = "cold"
+WARM = "warm"
+CACHE_STATES = (COLD, WARM)
+COLD_PARTIAL = "cold_partial"
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", ""}
+
+
+def is_local_instance(connection_string: str) -> bool:
+    """
+    Returns True when the connection string points at a Postgres running on
+    this machine, the only case where we can restart it or touch its page cache.
+    """
+    host = urlparse(connection_string).hostname or ""
+    return host in LOCAL_HOSTS or host.startswith("/")
+
+
+def restart_postgres(restart_command: Optional[str] = None, wait_seconds: float = 30.0) -> bool:
+    """
+    Restarts the local Postgres server so shared buffers start out empty.
+
+    The command comes from the argument, the TPCH_PG_RESTART_CMD environment
+    variable, or falls back to `pg_ctl restart` when PGDATA is set.
+    Returns False if no restart command is available or it failed.
+    """
+    command = restart_command or os.getenv("TPCH_PG_RESTART_CMD")
+    if not command and os.getenv("PGDATA"):
+        command = f"pg_ctl restart -D {shlex.quote(os.environ['PGDATA'])} -m fast -w -t {int(wait_seconds)}"
+    if not command:
+        logger.warning("no Postgres restart command configured, shared buffers stay warm")
+        return False
+
+    try:
+        subprocess.run(shlex.split(command), check=True, timeout=wait_seconds + 10, capture_output=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("restarting Postgres failed: %s", e)
+        return False
+    return True
+
+
+def drop_os_page_cache() -> bool:
+    """
+    Flushes dirty pages and drops the Linux page cache. This needs root,
+    so a permission error is logged and reported instead of raised.
+    """
+    os.sync()
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError as e:
+        logger.warning("could not drop OS page cache: %s", e)
+        return False
+    return True
+
+
+def wait_until_ready(connection_string: str, timeout_seconds: float = 30.0) -> None:
+    """
+    Blocks until the database accepts connections again after a restart.
+    """
+    engine = get_tpch_engine(connection_string)
+    deadline = time.monotonic() + timeout_seconds
+    try:
+        while True:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("select 1"))
+                return
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+    finally:
+        engine.dispose()
+
+
+def flush_caches(connection_string: str, restart_command: Optional[str] = None) -> bool:
+    """
+    Puts the local instance into a cold state. Returns True only if both the
+    shared buffers and the OS page cache were actually emptied.
+    """
+    if not is_local_instance(connection_string):
+        logger.warning("cold cache requested for a remote instance, caches are left as is")
+        return False
+
+    restarted = restart_postgres(restart_command)
+    dropped = drop_os_page_cache()
+    if restarted:
+        wait_until_ready(connection_string)
+    return restarted and dropped
+
+
+def prewarm_tables(connection_string: str) -> None:
+    """
+    Loads every TPC-H table and its indexes into shared buffers with pg_prewarm.
+    Partitioned tables are expanded into their partitions; the partitioned
+    parents and their indexes have no storage of their own and are skipped.
+    """
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("create extension if not exists pg_prewarm"))
+            conn.execute(
+                text("""
+                    with tree as (
+                        select p.relid
+                        from unnest(cast(:tables as text[])) as t(name)
+                        cross join lateral pg_partition_tree(to_regclass(t.name)) as p
+                    ), relations as (
+                        select relid as oid from tree
+                        union select indexrelid from pg_index where indrelid in (select relid from tree)
+                        union select reltoastrelid from pg_class where oid in (select relid from tree)
+                    )
+                    select pg_prewarm(c.oid)
+                    from relations r
+                    join pg_class c on c.oid = r.oid
+                    where c.relkind in ('r', 'i', 'm', 't')
+                """),
+                {"tables": [model.__tablename__ for model in TPCH_MODELS]},
+            )
+    finally:
+        engine.dispose()
+
+
+def prepare_cache(connection_string: str, cache_state: str, restart_command: Optional[str] = None) -> str:
+    """
+    Brings the target database into the requested cache state and returns the
+    state it actually reached, which is "cold_partial" when a cold state was
+    requested but the caches could not all be emptied.
+    """
+    if cache_state == COLD:
+        return COLD if flush_caches(connection_string, restart_command) else COLD_PARTIAL
+    if cache_state == WARM:
+        prewarm_tables(connection_string)
+        return WARM
+    raise ValueError(f"Unknown cache state '{cache_state}', expected one of {CACHE_STATES}.")
@@ -0,0 +1,279 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from .registry import QUERY_NUMBERS, QUERY_TITLES
+
+# Command line entry point for the benchmark harness:
+#
+#     python -m benchmarks.cli list-queries
+#     python -m benchmarks.cli status [JOB_ID]
+#     python -m benchmarks.cli detect-regressions
+#     python -m benchmarks.cli run CONNECTION_STRING --db-type postgres --scale-factor 1 [--profile [PHASE ...]]
+#     python -m benchmarks.cli generate --rows 100000 [--output lineitem.csv] [--profile [PHASE ...]]
+#     python -m benchmarks.cli worker COORDINATOR_HOST
+#     python -m benchmarks.cli startup-bench
+#     python -m benchmarks.cli self-bench [--update-baseline]
+#
+# Only the standard library and the query registry are imported at module
+# level. Each command imports what it needs when it runs, so commands that
+# don't execute queries never load datafruit, sqlmodel, pandas or numpy.
+
+STARTUP_BUDGET_MS = 200.0
+
+
+def cmd_list_queries(args) -> int:
+    for query_number in QUERY_NUMBERS:
+        print(f"Q{query_number:<3} {QUERY_TITLES[query_number]}")
+    return 0
+
+
+def cmd_status(args) -> int:
+    connection_string = os.getenv("RESULTS_DB_URL")
+    if not connection_string:
+        print("RESULTS_DB_URL environment variable not set.", file=sys.stderr)
+        return 1
+
+    # plain SQLAlchemy core is much cheaper to import than the SQLModel models
+    from sqlalchemy import create_engine, text
+
+    statement = """
+        select job_id, db_type, scale_factor, status, power_score, created_at
+        from benchmarkrun
+    """
+    params = {}
+    if args.job_id:
+        statement += " where job_id = :job_id"
+        params["job_id"] = args.job_id
+    statement += " order by created_at desc limit :limit"
+    params["limit"] = args.limit
+
+    engine = create_engine(connection_string)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(statement), params).all()
+    finally:
+        engine.dispose()
+
+    for job_id, db_type, scale_factor, status, power_score, created_at in rows:
+        score = f"{power_score:.3f}" if power_score is not None else "-"
+        print(f"{job_id}  {db_type:<12} SF{scale_factor:<5} {status:<10} power={score:<10} {created_at:%Y-%m-%d %H:%M}")
+    return 0
+
+
+def cmd_detect_regressions(args) -> int:
+    """
+    Checks every completed run not checked yet, e.g. from a nightly job.
+    Exits 1 if any regression was found.
+    """
+    from sqlmodel import Session
+
+    from backend.regression import detect_new_regressions
+    from backend.result_models import get_results_engine
+
+    engine = get_results_engine()
+    try:
+        with Session(engine, expire_on_commit=False) as session:
+            events = detect_new_regressions(
+                session,
+                window=args.window,
+                min_history=args.min_history,
+                threshold=args.threshold,
+                alpha=args.alpha,
+            )
+    finally:
+        engine.dispose()
+
+    for event in events:
+        print(f"{event.job_id}  {event.db_type:<12} SF{event.scale_factor:<5} Q{event.query_number:<3} "
+              f"{event.cache_state or '-':<12} {event.variant or '-':<8} "
+              f"{event.baseline_seconds:.3f}s -> {event.current_seconds:.3f}s "
+              f"({event.relative_change:+.1%}, p={event.p_value:.2g})")
+    print(f"{len(events)} regression(s) found")
+    return 1 if events else 0
+
+
+def _profiler(args):
+    if args.profile is None:
+        return None
+    from .profiling import HarnessProfiler
+
+    return HarnessProfiler(profile_phases=args.profile)
+
+
+def _print_profile(profiler, file=sys.stdout) -> None:
+    report = profiler.report()
+    print(f"wall={report['wall_seconds']:.3f}s db={report['db_seconds']:.3f}s "
+          f"harness_overhead={report['harness_overhead_seconds']:.3f}s", file=file)
+    for phase, totals in report["phases"].items():
+        print(f"  {phase:<10} {totals['count']:8d} calls {totals['total_seconds']:10.3f}s", file=file)
+    for phase, profile in report["profiles"].items():
+        if profile:
+            print(f"--- {phase} ---\n{profile}", file=file)
+
+
+def cmd_run(args) -> int:
+    import uuid
+
+    from .runner import finalize_run, run_stream, save_run
+    from .tpch_schema import current_layout
+    from backend.result_models import BenchmarkRun
+
+    run = BenchmarkRun(
+        job_id=uuid.uuid4(),
+        db_type=args.db_type,
+        scale_factor=args.scale_factor,
+        layout=current_layout(args.connection_string),
+        status="running",
+    )
+    profiler = _profiler(args)
+    metrics = run_stream(
+        run.job_id,
+        args.connection_string,
+        query_numbers=args.queries or None,
+        cache_state=args.cache_state,
+        profiler=profiler,
+        query_timeout_seconds=args.query_timeout,
+        run_budget_seconds=args.run_budget,
+    )
+    finalize_run(run, metrics, profiler)
+    if args.save:
+        save_run(run, metrics, profiler)
+    for metric in metrics:
+        print(f"Q{metric.query_number:<3} {metric.execution_time_seconds:10.3f}s  {metric.status}")
+    print(f"power_score={run.power_score}")
+    if profiler is not None:
+        _print_profile(profiler)
+    return 0
+
+
+def cmd_generate(args) -> int:
+    """
+    Writes synthetic lineitem rows as CSV, e.g. for COPY into a target.
+    """
+    import csv
+
+    from .benchmark_jobs import generate_lineitem_rows
+
+    profiler = _profiler(args)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = None
+        for row in generate_lineitem_rows(args.rows, profiler):
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+    finally:
+        if args.output:
+            out.close()
+    if profiler is not None:
+        profiler.stop()
+        # keep stdout clean when it carries the CSV
+        _print_profile(profiler, file=sys.stderr if not args.output else sys.stdout)
+    return 0
+
+
+def cmd_worker(args) -> int:
+    from .distributed import worker_main
+
+    worker_main((args.coordinator, args.port), args.name)
+    return 0
+
+
+def cmd_startup_bench(args) -> int:
+    """
+    Times fresh interpreter runs of a non-executing command and fails if the
+    median exceeds the startup budget.
+    """
+    command = [sys.executable, "-m", "benchmarks.cli", *args.command]
+    samples = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    median = statistics.median(samples)
+    print(f"{' '.join(args.command)}: median {median:.1f} ms, min {min(samples):.1f} ms over {args.repeat} runs "
+          f"(budget {args.budget_ms:.0f} ms)")
+    return 0 if median <= args.budget_ms else 1
+
+
+def cmd_self_bench(args) -> int:
+    from .self_bench import main as self_bench_main
+
+    return self_bench_main(args.args)
+
+
+def _add_profile_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile", nargs="*", metavar="PHASE",
+        help="time the harness phases and print a report; listed phases are also profiled with cProfile",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmarks.cli", description="TPC-H benchmark harness")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list-queries", help="list the TPC-H queries").set_defaults(func=cmd_list_queries)
+
+    status = commands.add_parser("status", help="show recent benchmark runs from the results DB")
+    status.add_argument("job_id", nargs="?")
+    status.add_argument("--limit", type=int, default=20)
+    status.set_defaults(func=cmd_status)
+
+    detect = commands.add_parser("detect-regressions", help="check new runs in the results DB for slowdowns")
+    detect.add_argument("--window", type=int, default=20, help="earlier runs to compare against")
+    detect.add_argument("--min-history", type=int, default=5)
+    detect.add_argument("--threshold", type=float, default=0.10, help="minimum relative slowdown")
+    detect.add_argument("--alpha", type=float, default=0.01)
+    detect.set_defaults(func=cmd_detect_regressions)
+
+    run = commands.add_parser("run", help="run one query stream against a target")
+    run.add_argument("connection_string")
+    run.add_argument("--db-type", required=True)
+    run.add_argument("--scale-factor", type=int, required=True)
+    run.add_argument("--queries", type=int, nargs="*", choices=QUERY_NUMBERS, metavar="N")
+    run.add_argument("--cache-state", choices=("cold", "warm"))
+    run.add_argument("--query-timeout", type=float, help="per-query timeout in seconds")
+    run.add_argument("--run-budget", type=float, help="time budget for the whole stream in seconds")
+    run.add_argument("--save", action="store_true", help="write the run to the results DB (RESULTS_DB_URL)")
+    _add_profile_argument(run)
+    run.set_defaults(func=cmd_run)
+
+    generate = commands.add_parser("generate", help="write synthetic lineitem rows as CSV")
+    generate.add_argument("--rows", type=int, required=True)
+    generate.add_argument("--output", help="file to write instead of stdout")
+    _add_profile_argument(generate)
+    generate.set_defaults(func=cmd_generate)
+
+    worker = commands.add_parser("worker", help="join a distributed run as a worker")
+    worker.add_argument("coordinator")
+    worker.add_argument("--port", type=int, default=6543)
+    worker.add_argument("--name")
+    worker.set_defaults(func=cmd_worker)
+
+    bench = commands.add_parser("startup-bench", help="measure CLI startup time")
+    bench.add_argument("--repeat", type=int, default=10)
+    bench.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    bench.add_argument("command", nargs="*", default=["list-queries"])
+    bench.set_defaults(func=cmd_startup_bench)
+
+    self_bench = commands.add_parser("self-bench", help="benchmark the harness itself against local stand-ins")
+    self_bench.add_argument("args", nargs=argparse.REMAINDER, help="arguments passed to benchmarks.self_bench")
+    self_bench.set_defaults(func=cmd_self_bench)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import datafruit as dft
+import numpy as np
+from sqlmodel import text
+
+from .runner import STATUS_OK, finalize_run, run_stream, save_run
+from .stats import geometric_mean
+from .tpch_schema import get_tpch_engine
+from backend.result_models import BenchmarkRun, DesignExperiment
+
+# This file tries candidate physical designs (indexes, BRIN, materialized
+# views) one at a time: apply the design, rerun the queries it should help,
+# record build cost, size and speedup, then roll it back.
+
+
+class PhysicalDesign:
+    """
+    A candidate design: the statements that build it, the statements that
+    remove it again, the relations it creates (for measuring size) and the
+    TPC-H queries expected to benefit.
+
+    query_overrides maps a query number to SQL that replaces the query job
+    while the design is in place, for designs the planner cannot use on its
+    own (materialized views). The SQL is wrapped in a datafruit job so it is
+    timed exactly like the job it replaces.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        apply_sql: List[str],
+        rollback_sql: List[str],
+        relations: List[str],
+        affected_queries: List[int],
+        query_overrides: Optional[Dict[int, str]] = None,
+    ):
+        self.name = name
+        self.apply_sql = apply_sql
+        self.rollback_sql = rollback_sql
+        self.relations = relations
+        self.affected_queries = affected_queries
+        self.query_overrides = query_overrides or {}
+
+
+def override_job(sql: str) -> Callable:
+    """
+    Wraps replacement SQL in a datafruit job.
+    """
+    @dft.sql_job()
+    def run_override(db_instance: dft.PostgresDB):
+        dft.set_db(db_instance)
+        return sql
+
+    return run_override
+
+
+def index_design(name: str, table: str, definition: str, affected_queries: List[int], method: str = "btree") -> PhysicalDesign:
+    """
+    Shorthand for a design that is a single index, e.g.
+    index_design("brin_l_shipdate", "lineitem", "(l_shipdate)", [1, 6], method="brin").
+    """
+    return PhysicalDesign(
+        name=name,
+        apply_sql=[f"create index {name} on {table} using {method} {definition}"],
+        rollback_sql=[f"drop index if exists {name}"],
+        relations=[name],
+        affected_queries=affected_queries,
+    )
+
+
+CANDIDATE_DESIGNS = [
+    index_design("brin_l_shipdate", "lineitem", "(l_shipdate)", [1, 3, 6, 7, 14, 15, 20], method="brin"),
+    index_design("btree_l_partkey", "lineitem", "(l_partkey)", [2, 9, 14, 17, 19, 20]),
+    index_design("btree_ps_suppkey", "partsupp", "(ps_suppkey)", [2, 9, 11, 16, 20]),
+    index_design("btree_l_orderkey_cover", "lineitem", "(l_orderkey) include (l_suppkey, l_receiptdate, l_commitdate)", [4, 18, 21]),
+    index_design("btree_o_orderdate_cover", "orders", "(o_orderdate) include (o_orderkey, o_custkey)", [3, 4, 5, 8, 10]),
+    # precomputed Q15 revenue aggregate; Postgres does not rewrite queries onto
+    # materialized views, so Q15 is measured with a variant that reads it
+    PhysicalDesign(
+        name="mv_q15_revenue",
+        apply_sql=["""
+            create materialized view mv_q15_revenue as
+            select l_suppkey as supplier_no, sum(l_extendedprice * (1 - l_discount)) as total_revenue
+            from lineitem
+            where l_shipdate >= date '1996-01-01' and l_shipdate < date '1996-04-01'
+            group by l_suppkey
+        """],
+        rollback_sql=["drop materialized view if exists mv_q15_revenue"],
+        relations=["mv_q15_revenue"],
+        affected_queries=[15],
+        query_overrides={15: """
+            select s_suppkey, s_name, s_address, s_phone, total_revenue
+            from supplier s, mv_q15_revenue
+            where s.s_suppkey = supplier_no
+              and total_revenue = (select max(total_revenue) from mv_q15_revenue)
+            order by s_suppkey
+        """},
+    ),
+]
+
+
+def _median_times(metrics) -> Dict[int, float]:
+    per_query: Dict[int, List[float]] = {}
+    for m in metrics:
+        if m.status == STATUS_OK:
+            per_query.setdefault(m.query_number, []).append(m.execution_time_seconds)
+    return {query_number: float(np.median(times)) for query_number, times in per_query.items()}
+
+
+def run_design_experiment(
+    run: BenchmarkRun,
+    connection_string: str,
+    design: PhysicalDesign,
+    repetitions: int = 3,
+    **stream_kwargs,
+) -> DesignExperiment:
+    """
+    Measures one design against the current baseline and rolls it back,
+    even if the rerun fails.
+    """
+    engine = get_tpch_engine(connection_string)
+
+    def timed_stream(variant: str, overrides: Dict[int, str]) -> Dict[int, float]:
+        jobs = {query_number: override_job(sql) for query_number, sql in overrides.items()}
+        metrics = []
+        for _ in range(repetitions):
+            metrics += run_stream(
+                run.job_id,
+                connection_string,
+                query_numbers=design.affected_queries,
+                variant=variant,
+                job_overrides=jobs,
+                **stream_kwargs,
+            )
+        return _median_times(metrics)
+
+    try:
+        baseline = timed_stream("baseline", {})
+
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for statement in design.apply_sql:
+                conn.exec_driver_sql(statement)
+        build_seconds = time.perf_counter() - start
+
+        try:
+            with engine.connect() as conn:
+                size_bytes = sum(
+                    conn.execute(text("select pg_total_relation_size(cast(:name as regclass))"), {"name": name}).scalar()
+                    for name in design.relations
+                )
+            with_design = timed_stream(design.name, design.query_overrides)
+        finally:
+            with engine.begin() as conn:
+                for statement in design.rollback_sql:
+                    conn.exec_driver_sql(statement)
+    finally:
+        engine.dispose()
+
+    speedups = [
+        baseline[query_number] / with_design[query_number]
+        for query_number in design.affected_queries
+        if query_number in baseline and with_design.get(query_number, 0) > 0
+    ]
+    return DesignExperiment(
+        job_id=run.job_id,
+        design_name=design.name,
+        affected_queries=",".join(str(q) for q in design.affected_queries),
+        build_seconds=build_seconds,
+        size_bytes=size_bytes,
+        baseline_seconds=sum(baseline.values()),
+        design_seconds=sum(with_design.values()),
+        speedup=geometric_mean(speedups),
+    )
+
+
+def run_design_advisor(
+    run: BenchmarkRun,
+    connection_string: str,
+    designs: Optional[Iterable[PhysicalDesign]] = None,
+    save: bool = False,
+    **experiment_kwargs,
+) -> List[DesignExperiment]:
+    """
+    Runs every candidate design in turn and ranks the outcomes by speedup
+    (rank 1 is best); designs without a measurable speedup rank last.
+    With save the run is finalized and written together with the ranked
+    experiments.
+    """
+    experiments = [
+        run_design_experiment(run, connection_string, design, **experiment_kwargs)
+        for design in (designs if designs is not None else CANDIDATE_DESIGNS)
+    ]
+    ranked = sorted(experiments, key=lambda e: -(e.speedup or 0.0))
+    for rank, experiment in enumerate(ranked, start=1):
+        experiment.rank = rank
+    if save:
+        finalize_run(run, [])
+        save_run(run, [], extra_rows=ranked)
+    return ranked
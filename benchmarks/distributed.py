@@ -0,0 +1,348 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import socket
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .metric_buffer import COLUMNS, STATUS_CODES, MetricBuffer
+from .runner import STATUS_ERROR, run_iterations
+from backend.result_models import BenchmarkRun
+
+# This file spreads the query streams of one BenchmarkRun over several
+# worker processes, which may run on other hosts. The coordinator measures
+# each worker's clock offset, hands out stream assignments, releases all
+# workers at the same instant and merges their per-stream metric buffers
+# onto its own clock.
+#
+# Messages are plain dicts sent over multiprocessing.connection, which
+# authenticates both sides with a shared key (BENCH_AUTHKEY) but unpickles
+# what it receives and does not encrypt it. Anyone holding the key can run
+# code in the coordinator, and the target's connection string is sent in the
+# clear, so keep the key secret and run across hosts only on a trusted
+# network or through an SSH tunnel.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 6543
+CLOCK_SYNC_ROUNDS = 16
+START_DELAY_SECONDS = 2.0
+
+# how long the coordinator waits for all workers to connect, and for a
+# protocol reply (hello, pong, ready) from a connected worker
+CONNECT_TIMEOUT_SECONDS = 60.0
+MESSAGE_TIMEOUT_SECONDS = 30.0
+# how often a blocked wait wakes up to check the deadline and the workers
+POLL_INTERVAL_SECONDS = 0.2
+
+
+def _authkey() -> bytes:
+    key = os.getenv("BENCH_AUTHKEY")
+    if not key:
+        raise RuntimeError("BENCH_AUTHKEY environment variable not set.")
+    return key.encode()
+
+
+# worker side
+
+def _run_assignment(assignment: dict) -> Tuple[Dict[str, np.ndarray], Dict[int, str]]:
+    """
+    Runs the assigned streams in parallel threads, each into its own buffer,
+    and returns the concatenated columns plus {stream: error} for streams
+    that stopped with an exception. Failed queries are recorded in the
+    buffers with status "error"; this only catches a stream that could not
+    carry on at all.
+    """
+    buffers = {stream: MetricBuffer(capacity=1024) for stream in assignment["streams"]}
+    failures: Dict[int, str] = {}
+
+    def run(stream: int, buffer: MetricBuffer) -> None:
+        try:
+            run_iterations(
+                connection_string=assignment["connection_string"],
+                buffer=buffer,
+                iterations=assignment["iterations"],
+                query_numbers=assignment["query_numbers"],
+                stream=stream,
+                timeout_seconds=assignment["timeout_seconds"],
+                job_overrides=assignment["job_overrides"],
+            )
+        except Exception as e:
+            logger.exception("stream %d failed", stream)
+            failures[stream] = repr(e)
+
+    threads = [
+        threading.Thread(target=run, args=(stream, buffer), name=f"stream-{stream}")
+        for stream, buffer in buffers.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    columns = {
+        name: np.concatenate([buffer.column(name) for buffer in buffers.values()]) if buffers else np.empty(0, dtype)
+        for name, dtype in COLUMNS
+    }
+    return columns, failures
+
+
+def worker_main(address: Tuple[str, int], name: Optional[str] = None, authkey: Optional[bytes] = None) -> None:
+    """
+    Connects to a coordinator, answers clock probes, waits for the start
+    signal, runs its streams and sends the results back.
+    """
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    with Client(address, authkey=authkey or _authkey()) as conn:
+        conn.send({"type": "hello", "worker": name})
+        assignment = None
+        while True:
+            message = conn.recv()
+            if message["type"] == "ping":
+                conn.send({"type": "pong", "t0": message["t0"], "t1": time.time_ns()})
+            elif message["type"] == "assign":
+                assignment = message
+                conn.send({"type": "ready"})
+            elif message["type"] == "start":
+                # start_at is on the coordinator's clock, offset converts it to ours
+                local_start_ns = message["start_at_ns"] + assignment["offset_ns"]
+                delay = (local_start_ns - time.time_ns()) / 1e9
+                if delay > 0:
+                    time.sleep(delay)
+                columns, failures = _run_assignment(assignment)
+                columns["start_ns"] = columns["start_ns"] - assignment["offset_ns"]
+                columns["end_ns"] = columns["end_ns"] - assignment["offset_ns"]
+                conn.send({"type": "result", "worker": name, "columns": columns, "failures": failures})
+                return
+
+
+# coordinator side
+
+def measure_clock_offset(
+    conn,
+    rounds: int = CLOCK_SYNC_ROUNDS,
+    check: Optional[Callable[[], None]] = None,
+) -> Tuple[int, int]:
+    """
+    NTP-style offset estimate: worker_clock - coordinator_clock, taken from
+    the probe with the shortest round trip. Returns (offset_ns, rtt_ns).
+    """
+    best = None
+    for _ in range(rounds):
+        conn.send({"type": "ping", "t0": time.time_ns()})
+        reply = _recv(conn, "(clock sync)", MESSAGE_TIMEOUT_SECONDS, check)
+        t2 = time.time_ns()
+        rtt = t2 - reply["t0"]
+        offset = reply["t1"] - (reply["t0"] + t2) // 2
+        if best is None or rtt < best[1]:
+            best = (offset, rtt)
+    return best
+
+
+def assign_streams(streams: int, workers: int) -> List[List[int]]:
+    """
+    Round-robin split of stream ids 0..streams-1 over the workers.
+    """
+    return [list(range(w, streams, workers)) for w in range(workers)]
+
+
+def _deadline(timeout_seconds: Optional[float]) -> Optional[float]:
+    return time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+
+
+def _wait(ready: Callable[[float], bool], deadline: Optional[float], check: Optional[Callable[[], None]], what: str) -> None:
+    # wakes up every poll interval to give up at the deadline or when the
+    # check finds a worker gone
+    while not ready(POLL_INTERVAL_SECONDS):
+        if check is not None:
+            check()
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"timed out waiting for {what}")
+
+
+def _recv(conn, name: str, timeout_seconds: Optional[float], check: Optional[Callable[[], None]] = None):
+    """
+    conn.recv() with a timeout that fails instead of hanging when the
+    worker disappears.
+    """
+    _wait(conn.poll, _deadline(timeout_seconds), check, f"worker {name}")
+    try:
+        return conn.recv()
+    except EOFError:
+        raise RuntimeError(f"worker {name} disconnected") from None
+
+
+def _accept(listener: Listener, timeout_seconds: Optional[float], check: Optional[Callable[[], None]] = None):
+    """
+    listener.accept() with a timeout. Listener has no timeout of its own, so
+    the accept runs in a daemon thread that is left behind if it times out.
+    """
+    done = threading.Event()
+    outcome = {}
+
+    def target():
+        try:
+            outcome["conn"] = listener.accept()
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=target, name="accept", daemon=True).start()
+    _wait(done.wait, _deadline(timeout_seconds), check, "workers to connect")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["conn"]
+
+
+def coordinate(
+    run: BenchmarkRun,
+    connection_string: str,
+    workers: int,
+    streams: int,
+    address: Tuple[str, int] = ("127.0.0.1", DEFAULT_PORT),
+    iterations: int = 1,
+    query_numbers: Optional[Iterable[int]] = None,
+    timeout_seconds: Optional[float] = None,
+    listener: Optional[Listener] = None,
+    job_overrides: Optional[Dict[int, Callable]] = None,
+    connect_timeout_seconds: Optional[float] = CONNECT_TIMEOUT_SECONDS,
+    result_timeout_seconds: Optional[float] = None,
+    check_workers: Optional[Callable[[], None]] = None,
+) -> MetricBuffer:
+    """
+    Waits for `workers` workers to connect, runs `streams` streams across
+    them with a synchronized start and returns the merged executions as a
+    MetricBuffer; write it with runner.save_buffered_run, which converts it
+    to QueryMetric rows a chunk at a time. Sets run.throughput_score from
+    the merged wall-clock window.
+
+    Listens on localhost unless another address is given; pass e.g.
+    ("0.0.0.0", DEFAULT_PORT) to accept workers from other hosts.
+    job_overrides are sent to the workers (by reference, so they must be
+    importable there) and run in place of the registered jobs.
+
+    Raises TimeoutError if the workers don't connect within
+    connect_timeout_seconds or their results take longer than
+    result_timeout_seconds (no limit by default), RuntimeError if a worker
+    disconnects or any stream on any worker failed. check_workers is called
+    while waiting and should raise if a worker is known to be gone.
+    """
+    query_numbers = list(query_numbers) if query_numbers is not None else None
+    listener = listener or Listener(address, authkey=_authkey())
+    connections = []
+    try:
+        connect_deadline = _deadline(connect_timeout_seconds)
+        while len(connections) < workers:
+            remaining = connect_deadline - time.monotonic() if connect_deadline is not None else None
+            conn = _accept(listener, remaining, check_workers)
+            hello = _recv(conn, "(connecting)", MESSAGE_TIMEOUT_SECONDS, check_workers)
+            connections.append((hello["worker"], conn))
+
+        for (name, conn), stream_ids in zip(connections, assign_streams(streams, workers)):
+            offset_ns, _ = measure_clock_offset(conn, check=check_workers)
+            conn.send({
+                "type": "assign",
+                "job_id": str(run.job_id),
+                "connection_string": connection_string,
+                "streams": stream_ids,
+                "iterations": iterations,
+                "query_numbers": query_numbers,
+                "timeout_seconds": timeout_seconds,
+                "offset_ns": offset_ns,
+                "job_overrides": job_overrides,
+            })
+        # barrier: only release the start once every worker is ready
+        for name, conn in connections:
+            if _recv(conn, name, MESSAGE_TIMEOUT_SECONDS, check_workers)["type"] != "ready":
+                raise RuntimeError("worker failed to acknowledge its assignment")
+
+        start_at_ns = time.time_ns() + int(START_DELAY_SECONDS * 1e9)
+        for _, conn in connections:
+            conn.send({"type": "start", "start_at_ns": start_at_ns})
+
+        merged = MetricBuffer(capacity=1024)
+        failures = []
+        result_deadline = _deadline(result_timeout_seconds)
+        for name, conn in connections:
+            remaining = result_deadline - time.monotonic() if result_deadline is not None else None
+            result = _recv(conn, name, remaining, check_workers)
+            merged.extend(result["columns"])
+            failures += [f"{name} stream {stream}: {error}" for stream, error in result["failures"].items()]
+    finally:
+        for _, conn in connections:
+            conn.close()
+        listener.close()
+
+    if failures:
+        raise RuntimeError("streams failed: " + "; ".join(failures))
+    errors = int(np.count_nonzero(merged.column("status") == STATUS_CODES.index(STATUS_ERROR)))
+    if errors:
+        logger.warning("%d of %d query executions failed", errors, len(merged))
+
+    if len(merged):
+        window = (merged.column("end_ns").max() - merged.column("start_ns").min()) / 1e9
+        completed = int(np.count_nonzero(merged.column("status") == 0))
+        run.throughput_score = completed * 3600.0 / window if window > 0 else None
+    return merged
+
+
+def run_local(
+    run: BenchmarkRun,
+    connection_string: str,
+    workers: int,
+    streams: int,
+    **coordinate_kwargs,
+) -> MetricBuffer:
+    """
+    Runs coordinator and `workers` worker processes on this machine.
+    Raises RuntimeError as soon as a worker process dies without having
+    delivered its results.
+    """
+    # a throwaway key, the workers get it as a process argument
+    authkey = secrets.token_bytes(32)
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=worker_main, args=(listener.address, f"local-{i}", authkey), daemon=True)
+        for i in range(workers)
+    ]
+
+    def check_workers() -> None:
+        # a worker exits with 0 only after sending its result
+        for process in processes:
+            if not process.is_alive() and process.exitcode != 0:
+                raise RuntimeError(f"worker process {process.name} exited with code {process.exitcode}")
+
+    for process in processes:
+        process.start()
+    try:
+        return coordinate(
+            run, connection_string, workers, streams, listener=listener, check_workers=check_workers, **coordinate_kwargs
+        )
+    except BaseException:
+        # the run is lost, don't wait for the remaining workers to finish it
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Distributed TPC-H benchmark worker")
+    parser.add_argument("coordinator", help="coordinator host")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--name", default=None, help="worker name reported to the coordinator")
+    args = parser.parse_args(argv)
+    worker_main((args.coordinator, args.port), args.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from backend.result_models import QueryMetric
+
+# This file holds per-execution measurements in preallocated NumPy arrays
+# while a benchmark is in flight. Recording an execution writes a handful of
+# integers instead of building a QueryMetric, so memory grows by ~35 bytes per
+# execution and the garbage collector has nothing new to track; QueryMetric
+# rows are only built when the buffer is flushed.
+
+# status strings are stored as small integer codes
+STATUS_CODES = ("ok", "timeout", "skipped", "error")
+
+COLUMNS = (
+    ("query_number", np.int16),
+    ("stream", np.int32),
+    ("start_ns", np.int64),
+    ("end_ns", np.int64),
+    ("rows", np.int64),
+    ("status", np.uint8),
+)
+
+
+class MetricBuffer:
+    """
+    Columnar, append-only store of query executions.
+
+    Starts with `capacity` slots and doubles when full, so appends stay
+    amortized O(1) and the number of allocations is logarithmic in the
+    number of recorded executions. Not thread-safe: give each stream its
+    own buffer.
+    """
+
+    def __init__(self, capacity: int = 65536):
+        self._size = 0
+        self._arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._arrays["query_number"].shape[0]
+
+    def _grow(self) -> None:
+        new_capacity = max(self.capacity * 2, 1024)
+        for name, array in self._arrays.items():
+            grown = np.empty(new_capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._arrays[name] = grown
+
+    def record(self, query_number: int, stream: int, start_ns: int, end_ns: int, rows: int = -1, status: str = "ok") -> None:
+        """
+        Appends one execution. start_ns/end_ns are wall-clock nanoseconds
+        (time.time_ns()), rows is -1 when unknown.
+        """
+        if self._size == self.capacity:
+            self._grow()
+        i = self._size
+        arrays = self._arrays
+        arrays["query_number"][i] = query_number
+        arrays["stream"][i] = stream
+        arrays["start_ns"][i] = start_ns
+        arrays["end_ns"][i] = end_ns
+        arrays["rows"][i] = rows
+        arrays["status"][i] = STATUS_CODES.index(status)
+        self._size += 1
+
+    def extend(self, columns: Dict[str, np.ndarray]) -> None:
+        """
+        Appends whole columns at once, e.g. a buffer received from another
+        process. All columns must have the same length.
+        """
+        count = len(columns["query_number"])
+        while self._size + count > self.capacity:
+            self._grow()
+        for name, _ in COLUMNS:
+            self._arrays[name][self._size:self._size + count] = columns[name]
+        self._size += count
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Read-only view of the recorded values of one column.
+        """
+        view = self._arrays[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def durations_seconds(self) -> np.ndarray:
+        return (self.column("end_ns") - self.column("start_ns")) / 1e9
+
+    def flush(
+        self,
+        job_id: uuid.UUID,
+        chunk_size: int = 10000,
+        cache_state: Optional[str] = None,
+        variant: Optional[str] = None,
+    ) -> Iterator[List[QueryMetric]]:
+        """
+        Converts the buffer into QueryMetric rows, chunk_size at a time so the
+        caller can write and drop each chunk, then empties the buffer.
+        Run-level labels (cache_state, variant) are applied to every row.
+        """
+        durations = self.durations_seconds()
+        arrays = {name: self.column(name) for name, _ in COLUMNS}
+        for chunk_start in range(0, self._size, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, self._size)
+            yield [
+                QueryMetric(
+                    job_id=job_id,
+                    query_number=int(arrays["query_number"][i]),
+                    stream=int(arrays["stream"][i]),
+                    started_at=datetime.fromtimestamp(arrays["start_ns"][i] / 1e9, tz=timezone.utc).replace(tzinfo=None),
+                    execution_time_seconds=float(durations[i]),
+                    rows_returned=int(arrays["rows"][i]) if arrays["rows"][i] >= 0 else None,
+                    status=STATUS_CODES[arrays["status"][i]],
+                    cache_state=cache_state,
+                    variant=variant,
+                )
+                for i in range(chunk_start, chunk_end)
+            ]
+        self.clear()
+
+    def clear(self) -> None:
+        self._size = 0
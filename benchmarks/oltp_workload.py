@@ -0,0 +1,326 @@
+import asyncio
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import text
+
+from .cache_control import WARM
+from .runner import STATUS_OK, finalize_run, run_stream, save_run
+from .stats import geometric_mean, latency_percentiles
+from .tpch_schema import get_tpch_engine
+from backend.result_models import BenchmarkRun, OltpLatency, QueryMetric
+
+# This file generates transactional traffic (inserts, updates and point
+# lookups on Orders/LineItem/Customer) that runs next to the analytical
+# query streams, to measure how much the two workloads slow each other down.
+
+INSERT = "insert"
+UPDATE = "update"
+LOOKUP = "lookup"
+OPERATIONS = (INSERT, UPDATE, LOOKUP)
+
+# orders created by the workload get keys from here on, so they never collide
+# with generated data and can be removed afterwards
+ORDERKEY_BASE = 2_000_000_000
+
+# updates modify the first UPDATE_KEYS existing orders, whose original values
+# are saved when the workload is created and written back by cleanup()
+UPDATE_KEYS = 1000
+
+OLAP_VARIANT = "olap"
+MIXED_VARIANT = "mixed"
+
+
+class OltpWorkload:
+    """
+    Issues OLTP operations at fixed per-operation rates from an asyncio loop
+    running in a background thread. Operations are dispatched to a bounded
+    pool of worker threads, each with its own pooled connection.
+
+    Inserts create new orders with 1-4 line items, updates modify a fixed
+    range of existing orders, and lookups read random existing orders and
+    customers. cleanup() deletes the inserted orders and restores the updated
+    ones, so the benchmark dataset is unchanged once it has run.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        insert_rate: float = 10.0,
+        update_rate: float = 10.0,
+        lookup_rate: float = 50.0,
+        workers: int = 8,
+        seed: Optional[int] = None,
+    ):
+        self.rates = {INSERT: insert_rate, UPDATE: update_rate, LOOKUP: lookup_rate}
+        self.workers = workers
+        self._engine = get_tpch_engine(connection_string, pool_size=workers)
+        self._random = random.Random(seed)
+        self._next_orderkey = ORDERKEY_BASE
+        self._key_lock = threading.Lock()
+
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: Dict[str, int] = dict.fromkeys(OPERATIONS, 0)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        with self._engine.connect() as conn:
+            self._max_custkey = conn.execute(text("select coalesce(max(c_custkey), 1) from customer")).scalar()
+            self._max_partkey = conn.execute(text("select coalesce(max(p_partkey), 1) from part")).scalar()
+            self._max_suppkey = conn.execute(text("select coalesce(max(s_suppkey), 1) from supplier")).scalar()
+            self._max_orderkey = conn.execute(
+                text("select coalesce(max(o_orderkey), 1) from orders where o_orderkey < :base"),
+                {"base": ORDERKEY_BASE},
+            ).scalar()
+            self._saved_orders = conn.execute(
+                text("""
+                    select o_orderkey, o_orderstatus, o_totalprice from orders
+                    where o_orderkey < :base order by o_orderkey limit :n
+                """),
+                {"base": ORDERKEY_BASE, "n": UPDATE_KEYS},
+            ).mappings().all()
+            self._update_keys = [row["o_orderkey"] for row in self._saved_orders]
+            self._saved_lineitems = conn.execute(
+                text("""
+                    select l_orderkey, l_linenumber, l_linestatus, l_returnflag from lineitem
+                    where l_orderkey <= :last
+                """),
+                {"last": self._update_keys[-1] if self._update_keys else 0},
+            ).mappings().all()
+        if update_rate > 0 and not self._update_keys:
+            raise ValueError("OLTP updates need existing orders, load the dataset first or set update_rate=0.")
+
+    # operations, executed on the worker threads
+
+    def _insert(self, conn) -> None:
+        with self._key_lock:
+            orderkey = self._next_orderkey
+            self._next_orderkey += 1
+            rnd = random.Random(self._random.random())
+        orderdate = date(1992, 1, 1) + timedelta(days=rnd.randint(0, 2400))
+        conn.execute(
+            text("""
+                insert into orders (o_orderkey, o_custkey, o_orderstatus, o_totalprice, o_orderdate,
+                                    o_orderpriority, o_clerk, o_shippriority, o_comment)
+                values (:orderkey, :custkey, 'O', 0, :orderdate, '5-LOW', 'Clerk#oltp', 0, 'oltp workload')
+            """),
+            {"orderkey": orderkey, "custkey": rnd.randint(1, self._max_custkey), "orderdate": orderdate},
+        )
+        conn.execute(
+            text("""
+                insert into lineitem (l_orderkey, l_partkey, l_suppkey, l_linenumber, l_quantity,
+                                      l_extendedprice, l_discount, l_tax, l_returnflag, l_linestatus,
+                                      l_shipdate, l_commitdate, l_receiptdate, l_shipinstruct,
+                                      l_shipmode, l_comment)
+                values (:orderkey, :partkey, :suppkey, :linenumber, :quantity, :price, 0.05, 0.02,
+                        'N', 'O', :shipdate, :commitdate, :receiptdate, 'NONE', 'MAIL', 'oltp workload')
+            """),
+            [
+                {
+                    "orderkey": orderkey,
+                    "partkey": rnd.randint(1, self._max_partkey),
+                    "suppkey": rnd.randint(1, self._max_suppkey),
+                    "linenumber": linenumber,
+                    "quantity": rnd.randint(1, 50),
+                    "price": round(rnd.uniform(100.0, 100000.0), 2),
+                    "shipdate": orderdate + timedelta(days=5),
+                    "commitdate": orderdate + timedelta(days=15),
+                    "receiptdate": orderdate + timedelta(days=25),
+                }
+                for linenumber in range(1, rnd.randint(1, 4) + 1)
+            ],
+        )
+
+    def _update(self, conn) -> None:
+        with self._key_lock:
+            orderkey = self._random.choice(self._update_keys)
+        conn.execute(
+            text("update lineitem set l_linestatus = 'F', l_returnflag = 'A' where l_orderkey = :orderkey"),
+            {"orderkey": orderkey},
+        )
+        conn.execute(
+            text("""
+                update orders set o_orderstatus = 'F',
+                    o_totalprice = (select coalesce(sum(l_extendedprice), 0) from lineitem where l_orderkey = :orderkey)
+                where o_orderkey = :orderkey
+            """),
+            {"orderkey": orderkey},
+        )
+
+    def _lookup(self, conn) -> None:
+        with self._key_lock:
+            orderkey = self._random.randint(1, self._max_orderkey)
+            custkey = self._random.randint(1, self._max_custkey)
+        conn.execute(text("select * from orders where o_orderkey = :k"), {"k": orderkey}).all()
+        conn.execute(text("select * from lineitem where l_orderkey = :k"), {"k": orderkey}).all()
+        conn.execute(text("select * from customer where c_custkey = :k"), {"k": custkey}).all()
+
+    def _execute(self, operation: str) -> None:
+        handler = {INSERT: self._insert, UPDATE: self._update, LOOKUP: self._lookup}[operation]
+        start = time.perf_counter()
+        try:
+            with self._engine.begin() as conn:
+                handler(conn)
+        except Exception:
+            with self._key_lock:
+                self.errors[operation] += 1
+            return
+        self.latencies[operation].append(time.perf_counter() - start)
+
+    # scheduling, on the event loop thread
+
+    async def _issue(self, operation: str, rate: float, executor: ThreadPoolExecutor, slots: asyncio.Semaphore) -> None:
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / rate
+        next_at = loop.time()
+        pending = set()
+        while not self._stopping.is_set():
+            await slots.acquire()
+            task = loop.run_in_executor(executor, self._execute, operation)
+            pending.add(task)
+            task.add_done_callback(lambda t: (pending.discard(t), slots.release()))
+            next_at += interval
+            delay = next_at - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        if pending:
+            await asyncio.wait(pending)
+
+    async def _main(self, ready: threading.Event) -> None:
+        self._stopping = asyncio.Event()
+        slots = asyncio.Semaphore(self.workers)
+        ready.set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="oltp") as executor:
+            await asyncio.gather(*[
+                self._issue(operation, rate, executor, slots)
+                for operation, rate in self.rates.items()
+                if rate > 0
+            ])
+
+    def start(self) -> None:
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_until_complete, args=(self._main(ready),), name="oltp-workload", daemon=True
+        )
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join()
+        self._loop.close()
+
+    def cleanup(self) -> None:
+        """
+        Removes every order and line item the workload inserted and restores
+        the orders and line items it updated.
+        """
+        with self._engine.begin() as conn:
+            conn.execute(text("delete from lineitem where l_orderkey >= :base"), {"base": ORDERKEY_BASE})
+            conn.execute(text("delete from orders where o_orderkey >= :base"), {"base": ORDERKEY_BASE})
+            if self._saved_lineitems:
+                conn.execute(
+                    text("""
+                        update lineitem set l_linestatus = :l_linestatus, l_returnflag = :l_returnflag
+                        where l_orderkey = :l_orderkey and l_linenumber = :l_linenumber
+                    """),
+                    [dict(row) for row in self._saved_lineitems],
+                )
+            if self._saved_orders:
+                conn.execute(
+                    text("""
+                        update orders set o_orderstatus = :o_orderstatus, o_totalprice = :o_totalprice
+                        where o_orderkey = :o_orderkey
+                    """),
+                    [dict(row) for row in self._saved_orders],
+                )
+        self._engine.dispose()
+
+    def latency_rows(self, job_id: uuid.UUID) -> List[OltpLatency]:
+        rows = []
+        for operation in OPERATIONS:
+            if self.rates[operation] <= 0:
+                continue
+            percentiles = latency_percentiles([s * 1000 for s in self.latencies[operation]])
+            rows.append(OltpLatency(
+                job_id=job_id,
+                operation=operation,
+                target_rate=self.rates[operation],
+                count=len(self.latencies[operation]),
+                errors=self.errors[operation],
+                p50_ms=percentiles["p50"],
+                p95_ms=percentiles["p95"],
+                p99_ms=percentiles["p99"],
+            ))
+        return rows
+
+
+def slowdown_factor(baseline: List[QueryMetric], mixed: List[QueryMetric]) -> Optional[float]:
+    """
+    Geometric mean of mixed / baseline execution time over the queries that
+    completed in both streams.
+    """
+    baseline_times = {m.query_number: m.execution_time_seconds for m in baseline if m.status == STATUS_OK}
+    return geometric_mean(
+        m.execution_time_seconds / baseline_times[m.query_number]
+        for m in mixed
+        if m.status == STATUS_OK and baseline_times.get(m.query_number, 0) > 0
+    )
+
+
+def run_mixed_workload(
+    run: BenchmarkRun,
+    connection_string: str,
+    insert_rate: float = 10.0,
+    update_rate: float = 10.0,
+    lookup_rate: float = 50.0,
+    workers: int = 8,
+    cache_state: Optional[str] = WARM,
+    save: bool = False,
+    **stream_kwargs,
+) -> Tuple[List[QueryMetric], List[OltpLatency]]:
+    """
+    Runs the query stream once on its own (variant "olap") and once with the
+    OLTP workload running next to it (variant "mixed"). Sets
+    run.oltp_slowdown_factor and returns all query metrics and the OLTP
+    latency percentiles.
+
+    Both streams run under the same cache_state; the default prewarms before
+    each, otherwise the olap stream would warm the cache for the mixed one
+    and hide part of the slowdown. With save the run is finalized and
+    written together with the latency rows.
+    """
+    baseline = run_stream(run.job_id, connection_string, cache_state=cache_state, variant=OLAP_VARIANT, **stream_kwargs)
+
+    workload = OltpWorkload(
+        connection_string,
+        insert_rate=insert_rate,
+        update_rate=update_rate,
+        lookup_rate=lookup_rate,
+        workers=workers,
+    )
+    workload.start()
+    try:
+        mixed = run_stream(run.job_id, connection_string, cache_state=cache_state, variant=MIXED_VARIANT, **stream_kwargs)
+    finally:
+        workload.stop()
+        workload.cleanup()
+
+    run.oltp_slowdown_factor = slowdown_factor(baseline, mixed)
+    metrics = baseline + mixed
+    latencies = workload.latency_rows(run.job_id)
+    if save:
+        finalize_run(run, metrics)
+        save_run(run, metrics, extra_rows=latencies)
+    return metrics, latencies
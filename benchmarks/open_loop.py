@@ -0,0 +1,171 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from .registry import QUERY_NUMBERS
+from .runner import STATUS_OK, finalize_run, run_query, save_run, stream_db_instance
+from .stats import latency_percentiles
+from backend.result_models import BenchmarkRun, LoadSweepPoint
+
+# This file drives the target with an open-loop arrival process: queries are
+# issued at scheduled times regardless of whether earlier ones finished, and
+# latency is measured from the scheduled (intended) start, so a stalled
+# database shows up as queueing delay instead of silently lowering the load.
+
+logger = logging.getLogger(__name__)
+
+POISSON = "poisson"
+FIXED = "fixed"
+
+
+def arrival_offsets(target_qps: float, duration_seconds: float, process: str = POISSON, seed: Optional[int] = None) -> np.ndarray:
+    """
+    Intended start offsets (seconds from the start of the window) for a
+    Poisson or fixed-rate arrival process at target_qps.
+    """
+    if process == FIXED:
+        return np.arange(0.0, duration_seconds, 1.0 / target_qps)
+    if process == POISSON:
+        rng = np.random.default_rng(seed)
+        # draw a few more gaps than expected and cut at the window end
+        gaps = rng.exponential(1.0 / target_qps, size=int(target_qps * duration_seconds * 1.5) + 16)
+        offsets = np.cumsum(gaps) - gaps[0]
+        return offsets[offsets < duration_seconds]
+    raise ValueError(f"Unknown arrival process '{process}', expected '{POISSON}' or '{FIXED}'.")
+
+
+def run_open_loop(
+    run: BenchmarkRun,
+    connection_string: str,
+    target_qps: float,
+    duration_seconds: float,
+    query_numbers: Optional[Iterable[int]] = None,
+    process: str = POISSON,
+    max_in_flight: int = 64,
+    query_timeout_seconds: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> LoadSweepPoint:
+    """
+    Issues queries at target_qps for duration_seconds and summarizes the
+    latencies measured from each query's intended start time.
+
+    Arrivals that find all max_in_flight slots busy wait for one, and that
+    wait counts towards their latency. Timed-out queries are included in the
+    percentiles with the time until they were cut off, a lower bound of their
+    real latency; queries that failed with an error are counted separately so
+    issued == completed + timeouts + errors.
+    """
+    query_numbers = list(query_numbers or QUERY_NUMBERS)
+    offsets = arrival_offsets(target_qps, duration_seconds, process, seed)
+    picker = random.Random(seed)
+    schedule = [(offset, picker.choice(query_numbers)) for offset in offsets]
+
+    latencies = np.full(len(schedule), np.nan)
+    lock = threading.Lock()
+    completed = timeouts = errors = 0
+    # each pool thread runs one query at a time, so it keeps its own tagged
+    # connection and only reconnects when the pool grows
+    connections = threading.local()
+
+    def execute(index: int, intended: float, query_number: int) -> None:
+        nonlocal completed, timeouts, errors
+        if not hasattr(connections, "db_instance"):
+            connections.db_instance, connections.application_name = stream_db_instance(
+                run.job_id, connection_string, query_timeout_seconds, "open"
+            )
+        try:
+            metric = run_query(
+                run.job_id,
+                query_number,
+                connection_string,
+                timeout_seconds=query_timeout_seconds,
+                db_instance=connections.db_instance,
+                application_name=connections.application_name,
+            )
+        except Exception:
+            logger.exception("open-loop query %d failed", query_number)
+            with lock:
+                errors += 1
+            return
+        latencies[index] = time.monotonic() - intended
+        with lock:
+            if metric.status == STATUS_OK:
+                completed += 1
+            else:
+                timeouts += 1
+
+    start = time.monotonic()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="open-loop") as executor:
+        for index, (offset, query_number) in enumerate(schedule):
+            intended = start + offset
+            delay = intended - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(execute, index, intended, query_number))
+    for future in futures:
+        # execute() handles query errors itself, anything left is a harness bug
+        future.result()
+
+    # the rate is taken over the arrival window; dividing by the time until
+    # the last query drained would count the backlog against the target
+    achieved_qps = completed / duration_seconds
+    percentiles = latency_percentiles(latencies[~np.isnan(latencies)])
+    return LoadSweepPoint(
+        job_id=run.job_id,
+        target_qps=target_qps,
+        achieved_qps=achieved_qps,
+        issued=len(schedule),
+        completed=completed,
+        timeouts=timeouts,
+        errors=errors,
+        p50_seconds=percentiles["p50"],
+        p95_seconds=percentiles["p95"],
+        p99_seconds=percentiles["p99"],
+        sustainable=timeouts == 0 and is_sustainable(target_qps, achieved_qps, latencies),
+    )
+
+
+def is_sustainable(target_qps: float, achieved_qps: float, latencies: np.ndarray, tolerance: float = 0.95) -> bool:
+    """
+    A rate is sustainable if almost all of it was served and latency did not
+    keep growing over the window (median of the last quarter of arrivals at
+    most twice the median of the first quarter).
+    """
+    if achieved_qps < target_qps * tolerance or np.isnan(latencies).any():
+        return False
+    quarter = max(len(latencies) // 4, 1)
+    return float(np.median(latencies[-quarter:])) <= 2.0 * float(np.median(latencies[:quarter]))
+
+
+def saturation_sweep(
+    run: BenchmarkRun,
+    connection_string: str,
+    qps_levels: Iterable[float],
+    duration_seconds: float = 60.0,
+    stop_on_saturation: bool = True,
+    save: bool = False,
+    **open_loop_kwargs,
+) -> List[LoadSweepPoint]:
+    """
+    Runs the open-loop load at increasing target rates and sets
+    run.max_sustainable_qps to the highest rate that was sustainable.
+    With save the run is finalized and written together with the points.
+    """
+    points = []
+    for target_qps in sorted(qps_levels):
+        point = run_open_loop(run, connection_string, target_qps, duration_seconds, **open_loop_kwargs)
+        points.append(point)
+        if point.sustainable:
+            run.max_sustainable_qps = target_qps
+        elif stop_on_saturation:
+            break
+    if save:
+        finalize_run(run, [])
+        save_run(run, [], extra_rows=points)
+    return points
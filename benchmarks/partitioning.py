@@ -0,0 +1,118 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlmodel import text
+
+from .runner import run_stream
+from .tpch_schema import (
+    HASH_BY_ORDERKEY,
+    HASH_PARTITION_COUNT,
+    HEAP,
+    PARTITION_KEYS,
+    RANGE_BY_DATE,
+    RANGE_PARTITION_YEARS,
+    current_layout,
+    get_tpch_engine,
+    partition_column,
+    partition_key_type,
+    with_session_settings,
+)
+from backend.result_models import BenchmarkRun, QueryMetric
+
+# This file loads data straight into the partitions of a partitioned
+# lineitem/orders layout and compares query times with partition pruning
+# switched on and off.
+
+# queries whose date predicates allow pruning under the range layout
+PRUNING_QUERIES = (1, 6, 12, 14, 15)
+
+PRUNED_VARIANT = "pruned"
+UNPRUNED_VARIANT = "unpruned"
+
+
+def _hash_partitions(conn, table_name: str, keys: List[int]) -> Dict[int, str]:
+    # Postgres' partition hash is not reproducible client side, so ask the
+    # server which remainder each distinct key in the batch belongs to. The
+    # keys must have the key column's type, satisfies_hash_partition rejects
+    # values that are not binary-coercible to it
+    key_type = partition_key_type(table_name, HASH_BY_ORDERKEY)
+    rows = conn.execute(
+        text(f"""
+            select k, r
+            from unnest(cast(:keys as {key_type}[])) as k, generate_series(0, :n - 1) as r
+            where satisfies_hash_partition(cast(:table as regclass)::oid, :n, r, k)
+        """),
+        {"keys": keys, "n": HASH_PARTITION_COUNT, "table": table_name},
+    )
+    return {key: f"{table_name}_h{remainder}" for key, remainder in rows}
+
+
+def route_rows(conn, table_name: str, rows: List[dict], layout: str) -> Dict[str, List[dict]]:
+    """
+    Groups a batch of rows by the partition they belong to.
+    """
+    if layout == HEAP or table_name not in PARTITION_KEYS:
+        return {table_name: rows}
+
+    column = partition_column(table_name, layout)
+    routed = defaultdict(list)
+    if layout == RANGE_BY_DATE:
+        for row in rows:
+            year = row[column].year
+            suffix = f"y{year}" if year in RANGE_PARTITION_YEARS else "default"
+            routed[f"{table_name}_{suffix}"].append(row)
+    elif layout == HASH_BY_ORDERKEY:
+        partitions = _hash_partitions(conn, table_name, sorted({row[column] for row in rows}))
+        for row in rows:
+            routed[partitions[row[column]]].append(row)
+    return routed
+
+
+def load_batch(connection_string: str, table_name: str, rows: List[dict], layout: str = HEAP) -> None:
+    """
+    Inserts a batch of rows, writing each group directly into its partition
+    instead of going through tuple routing on the parent table.
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.begin() as conn:
+            for target, group in route_rows(conn, table_name, rows, layout).items():
+                conn.execute(
+                    text(f"insert into {target} ({', '.join(columns)}) values ({', '.join(':' + c for c in columns)})"),
+                    group,
+                )
+    finally:
+        engine.dispose()
+
+
+def run_pruning_comparison(
+    run: BenchmarkRun,
+    connection_string: str,
+    query_numbers: Optional[Iterable[int]] = PRUNING_QUERIES,
+    **stream_kwargs,
+) -> List[QueryMetric]:
+    """
+    Runs the same stream with enable_partition_pruning on and off, labelling
+    the metrics "pruned" and "unpruned" under the same BenchmarkRun, and
+    records the layout the target was created with on the run.
+    """
+    query_numbers = list(query_numbers)
+    run.layout = current_layout(connection_string)
+    pruned = run_stream(
+        run.job_id,
+        with_session_settings(connection_string, enable_partition_pruning="on"),
+        query_numbers=query_numbers,
+        variant=PRUNED_VARIANT,
+        **stream_kwargs,
+    )
+    unpruned = run_stream(
+        run.job_id,
+        with_session_settings(connection_string, enable_partition_pruning="off"),
+        query_numbers=query_numbers,
+        variant=UNPRUNED_VARIANT,
+        **stream_kwargs,
+    )
+    return pruned + unpruned
@@ -0,0 +1,218 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+# This file instruments the benchmark harness itself, so the time spent
+# rendering jobs, converting results and writing metrics can be told apart
+# from the time the database spends executing the queries.
+
+# phases that are not counted as harness overhead
+DB_PHASE = "db"
+CACHE_PHASE = "cache"
+EXTERNAL_PHASES = {DB_PHASE, CACHE_PHASE}
+
+# the part of a datafruit job call outside the driver (rendering the
+# template, fetching and converting the result), and writing results
+JOB_PHASE = "job"
+WRITE_PHASE = "write"
+
+# seconds the current thread has spent in cursor.execute, maintained by the
+# SQLAlchemy event listeners installed by _install_statement_timer()
+_statement_time = threading.local()
+_statement_timer_lock = threading.Lock()
+_statement_timer_installed = False
+
+
+def _install_statement_timer() -> None:
+    global _statement_timer_installed
+    with _statement_timer_lock:
+        if _statement_timer_installed:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        @event.listens_for(Engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            _statement_time.started = time.perf_counter()
+
+        @event.listens_for(Engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(_statement_time, "started", None)
+            if started is not None:
+                _statement_time.seconds = getattr(_statement_time, "seconds", 0.0) + time.perf_counter() - started
+                _statement_time.started = None
+
+        _statement_timer_installed = True
+
+CPROFILE = "cprofile"
+SAMPLING = "sampling"
+
+
+class _StackSampler:
+    """
+    Minimal sampling profiler: a background thread records the stack of the
+    profiled thread every interval, counting "file:line function" frames.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float):
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(self.thread_id)
+            while frame is not None:
+                code = frame.f_code
+                self.counts[f"{code.co_filename}:{frame.f_lineno} {code.co_name}"] += 1
+                frame = frame.f_back
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class HarnessProfiler:
+    """
+    Span timer for harness phases with optional per-phase profile capture.
+
+    Wrap each phase in `with profiler.span("phase"):`. Phases listed in
+    profile_phases are additionally captured with cProfile or the sampling
+    profiler, depending on profile_mode.
+
+    Overhead is wall time minus database time, so a profiler measures one
+    stream; concurrent streams each need their own.
+    """
+
+    def __init__(
+        self,
+        profile_phases: Iterable[str] = (),
+        profile_mode: str = CPROFILE,
+        sample_interval_seconds: float = 0.005,
+    ):
+        if profile_mode not in (CPROFILE, SAMPLING):
+            raise ValueError(f"Unknown profile mode '{profile_mode}', expected '{CPROFILE}' or '{SAMPLING}'.")
+        self.profile_phases = set(profile_phases)
+        self.profile_mode = profile_mode
+        self.sample_interval_seconds = sample_interval_seconds
+
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        # call_job records from the timeout helper thread
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._samples: Dict[str, Counter] = defaultdict(Counter)
+        self._started = time.perf_counter()
+        self._stopped: Optional[float] = None
+
+    @contextmanager
+    def span(self, phase: str):
+        profiler = sampler = None
+        if phase in self.profile_phases:
+            if self.profile_mode == CPROFILE:
+                profiler = self._profiles.setdefault(phase, cProfile.Profile())
+                profiler.enable()
+            else:
+                sampler = _StackSampler(threading.get_ident(), self.sample_interval_seconds)
+                sampler.start()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(phase, time.perf_counter() - start)
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+                self._samples[phase].update(sampler.counts)
+
+    def _record(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.totals[phase] += seconds
+            self.counts[phase] += 1
+
+    def call_job(self, job: Callable, *args):
+        """
+        Calls a datafruit job and splits its wall time into the time the
+        driver spent executing statements (db phase) and the rest of the
+        call, i.e. rendering the template and converting the result (job
+        phase, counted as harness overhead). The split relies on SQLAlchemy
+        cursor events; if the job ran no statement through SQLAlchemy the
+        whole call is counted as db time.
+        """
+        _install_statement_timer()
+        _statement_time.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            return job(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            db_seconds = getattr(_statement_time, "seconds", 0.0) or elapsed
+            self._record(DB_PHASE, min(db_seconds, elapsed))
+            self._record(JOB_PHASE, max(elapsed - db_seconds, 0.0))
+
+    def wrap(self, phase: str, func: Callable) -> Callable:
+        """
+        Returns func wrapped in a span, for instrumenting calls such as
+        dft.pyjob generators that are handed to other code.
+        """
+        def wrapped(*args, **kwargs):
+            with self.span(phase):
+                return func(*args, **kwargs)
+        return wrapped
+
+    def stop(self) -> None:
+        self._stopped = time.perf_counter()
+
+    @property
+    def wall_seconds(self) -> float:
+        end = self._stopped if self._stopped is not None else time.perf_counter()
+        return end - self._started
+
+    @property
+    def harness_overhead_seconds(self) -> float:
+        """
+        Wall time not spent in database or cache-control phases.
+        """
+        external = sum(self.totals.get(phase, 0.0) for phase in EXTERNAL_PHASES)
+        return max(self.wall_seconds - external, 0.0)
+
+    def phase_profile(self, phase: str, limit: int = 20) -> Optional[str]:
+        """
+        Returns a text report of the captured profile for a phase.
+        """
+        if phase in self._profiles:
+            out = io.StringIO()
+            pstats.Stats(self._profiles[phase], stream=out).sort_stats("cumulative").print_stats(limit)
+            return out.getvalue()
+        if phase in self._samples:
+            return "\n".join(f"{count:8d}  {frame}" for frame, count in self._samples[phase].most_common(limit))
+        return None
+
+    def report(self) -> Dict:
+        """
+        Summary of the run: per-phase totals plus the overhead number that is
+        stored next to power_score.
+        """
+        return {
+            "wall_seconds": self.wall_seconds,
+            "db_seconds": self.totals.get(DB_PHASE, 0.0),
+            "harness_overhead_seconds": self.harness_overhead_seconds,
+            "phases": {
+                phase: {"count": self.counts[phase], "total_seconds": total}
+                for phase, total in sorted(self.totals.items(), key=lambda item: -item[1])
+            },
+            "profiles": {phase: self.phase_profile(phase) for phase in self.profile_phases},
+        }
@@ -0,0 +1,51 @@
+import importlib
+from typing import Callable, Dict
+
+# Lazily loaded registry of the TPC-H query jobs.
+#
+# Importing benchmark_jobs defines all 22 datafruit jobs and pulls in
+# datafruit, sqlmodel and pandas. Code that only needs to know which queries
+# exist (the CLI, schedulers, worker setup) reads the static table below and
+# the job module is imported the first time a job is actually requested.
+
+QUERY_TITLES: Dict[int, str] = {
+    1: "Pricing Summary Report Query",
+    2: "Minimum Cost Supplier Query",
+    3: "Shipping Priority Query",
+    4: "Order Priority Checking Query",
+    5: "Local Supplier Volume Query",
+    6: "Forecasting Revenue Change Query",
+    7: "Volume Shipping Query",
+    8: "National Market Share Query",
+    9: "Product Type Profit Measure Query",
+    10: "Returned Item Reporting Query",
+    11: "Important Stock Identification Query",
+    12: "Shipping Modes and Type Query",
+    13: "Customer Distribution Query",
+    14: "Promotion Effect Query",
+    15: "Top Supplier Query",
+    16: "Parts/Supplier Relationship Query",
+    17: "Small-Quantity-Order Revenue Query",
+    18: "Large Volume Customer Query",
+    19: "Discounted Revenue Query",
+    20: "Potential Part Promotion Query",
+    21: "Suppliers Who Kept Orders Waiting Query",
+    22: "Global Sales Opportunity Query",
+}
+
+QUERY_NUMBERS = tuple(sorted(QUERY_TITLES))
+
+_jobs: Dict[int, Callable] = {}
+
+
+def get_query_job(query_number: int) -> Callable:
+    """
+    Returns the datafruit job for a TPC-H query, importing the job module
+    on first use.
+    """
+    if query_number not in QUERY_TITLES:
+        raise KeyError(f"Unknown TPC-H query {query_number}, expected 1-22.")
+    if not _jobs:
+        jobs = importlib.import_module(".benchmark_jobs", __package__)
+        _jobs.update(jobs.TPCH_QUERY_JOBS)
+    return _jobs[query_number]
@@ -0,0 +1,230 @@
+import os
+import threading
+from typing import Dict, Optional, Set
+
+from sqlmodel import text
+
+from .cache_control import is_local_instance
+from .tpch_schema import get_tpch_engine
+
+# This file samples server-side resource usage while a query runs.
+# Cumulative counters (pg_stat_statements, pg_stat_database, pg_statio_*, WAL
+# position) only need a snapshot at start and stop; the background thread
+# polls pg_stat_activity for the backends serving the benchmark and /proc for
+# their CPU time. Those backends are found by the application_name the runner
+# tags the stream's connection with, plus any parallel workers they lead.
+#
+# With pg_stat_statements the block, temp and WAL deltas are taken for the
+# statements those backends ran (by query_id), otherwise they come from
+# database-wide counters and are only reported when no other backend was
+# active in the database while the query ran.
+
+COUNTERS_SQL = text("""
+    select
+        (select coalesce(sum(coalesce(heap_blks_read, 0) + coalesce(idx_blks_read, 0)
+                             + coalesce(toast_blks_read, 0) + coalesce(tidx_blks_read, 0)), 0)
+           from pg_statio_user_tables) as blocks_read,
+        (select coalesce(sum(coalesce(heap_blks_hit, 0) + coalesce(idx_blks_hit, 0)
+                             + coalesce(toast_blks_hit, 0) + coalesce(tidx_blks_hit, 0)), 0)
+           from pg_statio_user_tables) as blocks_hit,
+        (select temp_bytes from pg_stat_database where datname = current_database()) as temp_bytes,
+        pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0') as wal_bytes
+""")
+
+# per-statement counters, summed over the users and nesting levels that share a query_id
+STATEMENTS_SQL = text("""
+    select queryid,
+           sum(shared_blks_read) as blocks_read,
+           sum(shared_blks_hit) as blocks_hit,
+           sum(temp_blks_written) * current_setting('block_size')::bigint as temp_bytes,
+           sum(wal_bytes) as wal_bytes
+    from pg_stat_statements
+    where dbid = (select oid from pg_database where datname = current_database())
+    group by queryid
+""")
+
+# query_id is the backend's current statement, or its last one once it is idle
+BACKENDS_SQL = text("""
+    select pid, query_id from pg_stat_activity
+    where application_name = :name
+       or leader_pid in (select pid from pg_stat_activity where application_name = :name)
+""")
+
+OTHER_BACKENDS_SQL = text("""
+    select query_id from pg_stat_activity
+    where datname = current_database()
+      and backend_type = 'client backend'
+      and state = 'active'
+      and pid <> pg_backend_pid()
+      and application_name <> :name
+""")
+
+COUNTER_FIELDS = ("blocks_read", "blocks_hit", "temp_bytes", "wal_bytes")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def is_postgres_process(pid: int) -> bool:
+    """
+    Whether a pid belongs to a postgres process on this host. pg_stat_activity
+    reports pids in the server's PID namespace, which is not ours when the
+    server runs in a container, and there the same pid may be anything.
+    """
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read()
+    except OSError:
+        return False
+    # backends retitle themselves "postgres: user db ...", without
+    # update_process_title they keep the postmaster's argv
+    return b"postgres" in cmdline
+
+
+def read_process_cpu_seconds(pid: int) -> Optional[float]:
+    """
+    Returns user + system CPU seconds of a postgres process from /proc, or
+    None if the process is gone, is not postgres or /proc is unavailable.
+    """
+    if not is_postgres_process(pid):
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the command name can contain spaces, so split after its closing paren
+    fields = stat.rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+class ResourceSampler:
+    """
+    Measures resource deltas for one query at a time.
+
+    Call start() right before the query with the application_name of the
+    query's connection and stop() right after it; stop() returns a dict keyed
+    by QueryMetric field names. One sampler (and its dedicated connection) is
+    reused across a whole stream.
+
+    stop() polls the backends one last time, so it has to run before the
+    query's connection is closed; otherwise a query shorter than
+    interval_seconds is never seen.
+
+    Counters that can't be attributed to the query are None: without
+    pg_stat_statements whenever another backend was seen active in the
+    database, with it when another backend was seen running the same
+    statement (e.g. the same query in a concurrent stream).
+    """
+
+    def __init__(self, connection_string: str, interval_seconds: float = 0.5):
+        self.interval_seconds = interval_seconds
+        self.sample_cpu = is_local_instance(connection_string)
+        self._engine = get_tpch_engine(connection_string)
+        self._conn = self._connect()
+        has_statements = self._conn.execute(
+            text("select count(*) from pg_extension where extname = 'pg_stat_statements'")
+        ).scalar() > 0
+        # pg_stat_activity.query_id exists from Postgres 14 on
+        version = int(self._conn.execute(text("show server_version_num")).scalar())
+        self.per_statement = has_statements and version >= 140000
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._application_name: Optional[str] = None
+        self._start_counters: Dict = {}
+        self._cpu_first: Dict[int, float] = {}
+        self._cpu_last: Dict[int, float] = {}
+        self._query_ids: Set[int] = set()
+        self._other_query_ids: Set[Optional[int]] = set()
+
+    def _connect(self):
+        return self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    def _ensure_connection(self) -> None:
+        # a cold-cache restart kills our connection between queries
+        try:
+            self._conn.execute(text("select 1"))
+        except Exception:
+            self._conn.invalidate()
+            self._engine.dispose()
+            self._conn = self._connect()
+
+    def _read_counters(self) -> Dict:
+        if self.per_statement:
+            return {
+                row["queryid"]: {key: float(row[key] or 0) for key in COUNTER_FIELDS}
+                for row in self._conn.execute(STATEMENTS_SQL).mappings()
+            }
+        row = self._conn.execute(COUNTERS_SQL).mappings().one()
+        return {key: float(row[key] or 0) for key in COUNTER_FIELDS}
+
+    def _poll(self, baseline: bool = False) -> None:
+        name = {"name": self._application_name}
+        backends = self._conn.execute(BACKENDS_SQL, name).all() if self.per_statement or self.sample_cpu else []
+        others = [row[0] for row in self._conn.execute(OTHER_BACKENDS_SQL, name)]
+        with self._lock:
+            self._other_query_ids.update(others)
+            for pid, query_id in backends:
+                if query_id is not None and not baseline:
+                    self._query_ids.add(query_id)
+                if not self.sample_cpu:
+                    continue
+                cpu = read_process_cpu_seconds(pid)
+                if cpu is None:
+                    continue
+                if pid not in self._cpu_first:
+                    # backends that appear after start() (the query connection, parallel workers) started from zero
+                    self._cpu_first[pid] = cpu if baseline else 0.0
+                self._cpu_last[pid] = cpu
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self._poll()
+
+    def start(self, application_name: str) -> None:
+        self._application_name = application_name
+        self._ensure_connection()
+        self._start_counters = self._read_counters()
+        self._cpu_first.clear()
+        self._cpu_last.clear()
+        self._query_ids.clear()
+        self._other_query_ids.clear()
+        self._poll(baseline=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def _counter_deltas(self) -> Dict[str, Optional[int]]:
+        self._conn.execute(text("select pg_stat_clear_snapshot()"))
+        end = self._read_counters()
+        if not self.per_statement:
+            if self._other_query_ids:
+                return dict.fromkeys(COUNTER_FIELDS)
+            return {key: int(end[key] - self._start_counters[key]) for key in COUNTER_FIELDS}
+
+        if not self._query_ids or self._query_ids & self._other_query_ids:
+            return dict.fromkeys(COUNTER_FIELDS)
+        deltas = dict.fromkeys(COUNTER_FIELDS, 0)
+        for query_id in self._query_ids:
+            before = self._start_counters.get(query_id, {})
+            for key in COUNTER_FIELDS:
+                deltas[key] += int(end.get(query_id, {}).get(key, 0) - before.get(key, 0))
+        return deltas
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._poll()
+
+        cpu_seconds = None
+        if self.sample_cpu:
+            with self._lock:
+                cpu_seconds = sum(self._cpu_last[pid] - self._cpu_first[pid] for pid in self._cpu_last)
+        return {**self._counter_deltas(), "cpu_seconds": cpu_seconds}
+
+    def close(self) -> None:
+        self._conn.close()
+        self._engine.dispose()
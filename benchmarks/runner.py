@@ -0,0 +1,426 @@
+import logging
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from sqlmodel import Session, SQLModel, text
+
+from .cache_control import CACHE_STATES, COLD, WARM, prepare_cache
+from .metric_buffer import STATUS_CODES, MetricBuffer
+from .profiling import CACHE_PHASE, WRITE_PHASE, HarnessProfiler
+from .registry import QUERY_NUMBERS, get_query_job
+from .resource_sampler import ResourceSampler
+from .stats import geometric_mean
+from .tpch_schema import get_tpch_db_instance, get_tpch_engine, with_session_settings
+from backend.result_models import BenchmarkRun, QueryMetric, get_results_engine
+
+# This file executes TPC-H query streams against a target database
+# and turns each execution into a QueryMetric.
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+STATUS_ERROR = "error"
+
+# how long to wait for a cancelled query to give its connection back
+CANCEL_GRACE_SECONDS = 10.0
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def _span(profiler: Optional[HarnessProfiler], phase: str):
+    return profiler.span(phase) if profiler is not None else nullcontext()
+
+
+def _is_statement_timeout(error: BaseException) -> bool:
+    # psycopg reports both statement_timeout and pg_cancel_backend as a cancel
+    return "canceling statement" in str(error)
+
+
+def cancel_backends(connection_string: str, application_name: str) -> None:
+    """
+    Cancels whatever the connections tagged with application_name are running.
+    """
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("select pg_cancel_backend(pid) from pg_stat_activity where application_name = :name"),
+                {"name": application_name},
+            )
+    finally:
+        engine.dispose()
+
+
+def _execute_with_timeout(job, db_instance, connection_string: str, application_name: str, timeout_seconds: float):
+    """
+    Runs the job in a helper thread and waits at most timeout_seconds for it.
+    The server enforces statement_timeout on its own; this is the client-side
+    backstop for when the server or network doesn't return in time.
+    Raises QueryTimeout if the query was cut off either way.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = job(db_instance)
+        except BaseException as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=target, name=f"query-{application_name}", daemon=True)
+    worker.start()
+    worker.join(timeout_seconds)
+    if worker.is_alive():
+        cancel_backends(connection_string, application_name)
+        worker.join(CANCEL_GRACE_SECONDS)
+        raise QueryTimeout(application_name)
+
+    if "error" in outcome:
+        if _is_statement_timeout(outcome["error"]):
+            raise QueryTimeout(application_name) from outcome["error"]
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def stream_db_instance(
+    job_id: uuid.UUID,
+    connection_string: str,
+    timeout_seconds: Optional[float] = None,
+    label: str = "s",
+) -> tuple:
+    """
+    Returns (db_instance, application_name) for a stream of queries. The
+    tag lets the stream's queries be cancelled and its backend be sampled;
+    reusing one instance keeps connection setup out of the timed queries.
+    timeout_seconds becomes the connection's statement_timeout.
+    """
+    application_name = f"tpch-{job_id.hex[:8]}-{label}-{uuid.uuid4().hex[:6]}"
+    settings = {"application_name": application_name}
+    if timeout_seconds is not None:
+        settings["statement_timeout"] = f"{max(int(timeout_seconds * 1000), 1)}ms"
+    return get_tpch_db_instance(with_session_settings(connection_string, **settings)), application_name
+
+
+def run_query(
+    job_id: uuid.UUID,
+    query_number: int,
+    connection_string: str,
+    cache_state: Optional[str] = None,
+    sampler: Optional[ResourceSampler] = None,
+    profiler: Optional[HarnessProfiler] = None,
+    timeout_seconds: Optional[float] = None,
+    variant: Optional[str] = None,
+    job: Optional[Callable] = None,
+    db_instance=None,
+    application_name: Optional[str] = None,
+) -> QueryMetric:
+    """
+    Executes a single TPC-H query and records its wall time.
+    For a cold cache state the caches are flushed right before the query;
+    if that only partly succeeded the metric is tagged "cold_partial".
+    If a sampler is given its resource deltas are attached to the metric.
+
+    With timeout_seconds the query is cancelled from the client if it still
+    runs after that; it is then recorded with status "timeout" instead of
+    raising.
+
+    job replaces the query's registered job, e.g. with a rewritten query
+    that is timed through the same path.
+
+    db_instance and application_name come from stream_db_instance() when the
+    query is part of a stream; without them a tagged instance is created for
+    this query alone, whose server-side statement_timeout is timeout_seconds.
+    """
+    if cache_state == COLD:
+        with _span(profiler, CACHE_PHASE):
+            cache_state = prepare_cache(connection_string, COLD)
+
+    with _span(profiler, "setup"):
+        job = job or get_query_job(query_number)
+        if db_instance is None:
+            db_instance, application_name = stream_db_instance(job_id, connection_string, timeout_seconds, f"q{query_number}")
+
+    if sampler is not None:
+        with _span(profiler, "sampling"):
+            sampler.start(application_name)
+    # the job call renders the template, executes it and builds the result
+    # frame; the profiler splits the statement time from the rest
+    if profiler is not None:
+        job = partial(profiler.call_job, job)
+    status = STATUS_OK
+    start = time.perf_counter()
+    try:
+        if timeout_seconds is not None:
+            _execute_with_timeout(job, db_instance, connection_string, application_name, timeout_seconds)
+        else:
+            job(db_instance)
+    except QueryTimeout:
+        status = STATUS_TIMEOUT
+    elapsed = time.perf_counter() - start
+    usage = {}
+    if sampler is not None:
+        # db_instance still holds the query's pooled connection here, so the
+        # sampler's last poll sees the backend before it exits
+        with _span(profiler, "sampling"):
+            usage = sampler.stop()
+
+    with _span(profiler, "convert"):
+        return QueryMetric(
+            job_id=job_id,
+            query_number=query_number,
+            execution_time_seconds=elapsed,
+            status=status,
+            cache_state=cache_state,
+            variant=variant,
+            **usage,
+        )
+
+
+def run_stream(
+    job_id: uuid.UUID,
+    connection_string: str,
+    query_numbers: Optional[Iterable[int]] = None,
+    cache_state: Optional[str] = None,
+    sample_interval_seconds: Optional[float] = None,
+    profiler: Optional[HarnessProfiler] = None,
+    query_timeout_seconds: Optional[float] = None,
+    run_budget_seconds: Optional[float] = None,
+    variant: Optional[str] = None,
+    job_overrides: Optional[Dict[int, Callable]] = None,
+) -> List[QueryMetric]:
+    """
+    Executes a stream of TPC-H queries in order (all 22 by default).
+
+    With cache_state="warm" the tables are prewarmed once before the stream,
+    with cache_state="cold" the caches are flushed before every query.
+    Setting sample_interval_seconds enables server-side resource sampling.
+
+    query_timeout_seconds bounds each query and run_budget_seconds bounds the
+    whole stream; a query never gets more than what is left of the budget,
+    and once the budget is spent the remaining queries are recorded as skipped.
+
+    variant labels the metrics when one run executes the stream under
+    several conditions (e.g. "olap" and "mixed"), and job_overrides maps
+    query numbers to jobs that run in place of the registered ones.
+    """
+    if cache_state is not None and cache_state not in CACHE_STATES:
+        raise ValueError(f"Unknown cache state '{cache_state}', expected one of {CACHE_STATES}.")
+    if query_numbers is None:
+        query_numbers = QUERY_NUMBERS
+
+    if cache_state == WARM:
+        with _span(profiler, CACHE_PHASE):
+            prepare_cache(connection_string, WARM)
+
+    sampler = None
+    if sample_interval_seconds is not None:
+        sampler = ResourceSampler(connection_string, interval_seconds=sample_interval_seconds)
+
+    # the server enforces the per-query timeout, the client-side backstop
+    # also covers what is left of the run budget. A cold flush may restart
+    # the server and drop the connection, so cold queries connect on their own
+    db_instance = application_name = None
+    if cache_state != COLD:
+        db_instance, application_name = stream_db_instance(job_id, connection_string, query_timeout_seconds)
+
+    deadline = time.monotonic() + run_budget_seconds if run_budget_seconds is not None else None
+    metrics = []
+    try:
+        for query_number in query_numbers:
+            timeout_seconds = query_timeout_seconds
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.append(QueryMetric(
+                        job_id=job_id,
+                        query_number=query_number,
+                        execution_time_seconds=0.0,
+                        status=STATUS_SKIPPED,
+                        cache_state=cache_state,
+                        variant=variant,
+                    ))
+                    continue
+                timeout_seconds = remaining if timeout_seconds is None else min(timeout_seconds, remaining)
+
+            metrics.append(run_query(
+                job_id,
+                query_number,
+                connection_string,
+                cache_state=cache_state,
+                sampler=sampler,
+                profiler=profiler,
+                timeout_seconds=timeout_seconds,
+                variant=variant,
+                job=(job_overrides or {}).get(query_number),
+                db_instance=db_instance,
+                application_name=application_name,
+            ))
+        return metrics
+    finally:
+        if sampler is not None:
+            sampler.close()
+
+
+def run_iterations(
+    connection_string: str,
+    buffer: MetricBuffer,
+    iterations: int,
+    query_numbers: Optional[Iterable[int]] = None,
+    stream: int = 0,
+    timeout_seconds: Optional[float] = None,
+    job_overrides: Optional[Dict[int, Callable]] = None,
+) -> MetricBuffer:
+    """
+    Repeats the query stream `iterations` times, recording every execution
+    into the buffer instead of creating QueryMetric objects. Convert the
+    buffer with buffer.flush(job_id) once the run is over.
+
+    A query that fails is logged and recorded with status "error", and the
+    stream carries on with the next one. job_overrides works as in run_stream.
+    """
+    job_overrides = job_overrides or {}
+    jobs = [(q, job_overrides.get(q) or get_query_job(q)) for q in (query_numbers or QUERY_NUMBERS)]
+    application_name = f"tpch-iter-s{stream}-{uuid.uuid4().hex[:6]}"
+    if timeout_seconds is not None:
+        db_instance = get_tpch_db_instance(with_session_settings(
+            connection_string,
+            statement_timeout=f"{max(int(timeout_seconds * 1000), 1)}ms",
+            application_name=application_name,
+        ))
+    else:
+        db_instance = get_tpch_db_instance(connection_string)
+
+    for _ in range(iterations):
+        for query_number, job in jobs:
+            status = STATUS_OK
+            result = None
+            start_ns = time.time_ns()
+            start = time.perf_counter_ns()
+            try:
+                if timeout_seconds is not None:
+                    result = _execute_with_timeout(job, db_instance, connection_string, application_name, timeout_seconds)
+                else:
+                    result = job(db_instance)
+            except QueryTimeout:
+                status = STATUS_TIMEOUT
+            except Exception:
+                logger.exception("stream %d: query %d failed", stream, query_number)
+                status = STATUS_ERROR
+            end_ns = start_ns + time.perf_counter_ns() - start
+            rows = len(result) if hasattr(result, "__len__") else -1
+            buffer.record(query_number, stream, start_ns, end_ns, rows, status)
+    return buffer
+
+
+def power_score(metrics: Union[List[QueryMetric], MetricBuffer]) -> Optional[float]:
+    """
+    Geometric mean of the query times, as stored on BenchmarkRun.power_score.
+    Only queries that completed are counted.
+    """
+    if isinstance(metrics, MetricBuffer):
+        completed = metrics.column("status") == STATUS_CODES.index(STATUS_OK)
+        return geometric_mean(metrics.durations_seconds()[completed])
+    return geometric_mean(m.execution_time_seconds for m in metrics if m.status == STATUS_OK)
+
+
+def finalize_run(
+    run: BenchmarkRun,
+    metrics: Union[List[QueryMetric], MetricBuffer],
+    profiler: Optional[HarnessProfiler] = None,
+) -> BenchmarkRun:
+    """
+    Fills in the summary fields of a finished run.
+    """
+    run.power_score = power_score(metrics)
+    if profiler is not None:
+        profiler.stop()
+        run.harness_overhead_seconds = profiler.harness_overhead_seconds
+    run.status = "completed"
+    run.completed_at = datetime.utcnow()
+    return run
+
+
+def save_run(
+    run: BenchmarkRun,
+    metrics: List[QueryMetric],
+    profiler: Optional[HarnessProfiler] = None,
+    extra_rows: Iterable[SQLModel] = (),
+) -> BenchmarkRun:
+    """
+    Writes a finalized run and its metrics to the results database.
+    extra_rows are the run's other result rows (OltpLatency, LoadSweepPoint,
+    ...), written in the same transaction.
+    With a profiler the write is timed as harness overhead, and the run's
+    harness_overhead_seconds is updated once the write is done.
+    """
+    engine = get_results_engine()
+    try:
+        with Session(engine, expire_on_commit=False) as session:
+            with _span(profiler, WRITE_PHASE):
+                session.add(run)
+                session.add_all(metrics)
+                session.add_all(list(extra_rows))
+                session.commit()
+            _save_overhead(session, run, profiler)
+    finally:
+        engine.dispose()
+    return run
+
+
+def save_buffered_run(
+    run: BenchmarkRun,
+    buffer: MetricBuffer,
+    profiler: Optional[HarnessProfiler] = None,
+    chunk_size: int = 10000,
+    cache_state: Optional[str] = None,
+    variant: Optional[str] = None,
+) -> BenchmarkRun:
+    """
+    Writes a finalized run and the executions recorded in a MetricBuffer.
+    The buffer is converted and committed one chunk at a time, so no more
+    than chunk_size QueryMetric objects exist at once; it is empty afterwards.
+    """
+    engine = get_results_engine()
+    try:
+        with Session(engine, expire_on_commit=False) as session:
+            with _span(profiler, WRITE_PHASE):
+                session.add(run)
+                session.commit()
+                for chunk in buffer.flush(run.job_id, chunk_size, cache_state=cache_state, variant=variant):
+                    session.add_all(chunk)
+                    session.commit()
+            _save_overhead(session, run, profiler)
+    finally:
+        engine.dispose()
+    return run
+
+
+def _save_overhead(session: Session, run: BenchmarkRun, profiler: Optional[HarnessProfiler]) -> None:
+    # the write itself is harness overhead, so it is only known afterwards
+    if profiler is not None:
+        profiler.stop()
+        run.harness_overhead_seconds = profiler.harness_overhead_seconds
+        session.add(run)
+        session.commit()
+
+
+def save_rows(rows: Iterable[SQLModel]) -> None:
+    """
+    Writes result rows that belong to no single run (e.g. the ScalingFit
+    rows of a sweep) to the results database.
+    """
+    engine = get_results_engine()
+    try:
+        with Session(engine, expire_on_commit=False) as session:
+            session.add_all(list(rows))
+            session.commit()
+    finally:
+        engine.dispose()
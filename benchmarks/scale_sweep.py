@@ -0,0 +1,175 @@
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import text
+
+from .cache_control import COLD
+from .runner import STATUS_OK, finalize_run, run_stream, save_rows, save_run
+from .tpch_schema import current_layout, get_tpch_engine
+from backend.result_models import BenchmarkRun, QueryMetric, ScalingFit
+
+# This file runs the same benchmark over several scale factors and stream
+# counts and fits how each query's time grows with the data size.
+
+# orders has exactly 1.5M rows per unit of scale factor in TPC-H
+ORDERS_PER_SCALE_FACTOR = 1_500_000
+
+# loader(connection_string, current_scale_factor, target_scale_factor) grows
+# the dataset in place; it is called with current_scale_factor=0 when the
+# target is smaller than what is loaded and the data has to be rebuilt
+DatasetLoader = Callable[[str, int, int], None]
+
+
+def loaded_scale_factor(connection_string: str) -> int:
+    """
+    Estimates the scale factor currently loaded from the planner's row
+    estimate for orders, which avoids a full count on large datasets.
+    """
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("select greatest(reltuples, 0) from pg_class where relname = 'orders'")).scalar()
+    finally:
+        engine.dispose()
+    return int(round((rows or 0) / ORDERS_PER_SCALE_FACTOR))
+
+
+def ensure_scale_factor(connection_string: str, scale_factor: int, loader: DatasetLoader) -> None:
+    """
+    Reuses the loaded dataset when it already matches, grows it incrementally
+    when it is smaller, and has the loader rebuild it when it is larger.
+    """
+    current = loaded_scale_factor(connection_string)
+    if current == scale_factor:
+        return
+    loader(connection_string, current if current < scale_factor else 0, scale_factor)
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("analyze"))
+    finally:
+        engine.dispose()
+
+
+def run_concurrent_streams(run: BenchmarkRun, connection_string: str, streams: int, **stream_kwargs) -> List[QueryMetric]:
+    """
+    Runs `streams` query streams in parallel and sets run.throughput_score
+    to completed queries per hour.
+    """
+    if streams > 1 and stream_kwargs.get("profiler") is not None:
+        raise ValueError("A HarnessProfiler measures a single stream and cannot be shared by concurrent streams.")
+    if streams > 1 and stream_kwargs.get("cache_state") == COLD:
+        # every cold query restarts the server and aborts the other streams' queries
+        raise ValueError("cache_state='cold' cannot be used with more than one stream.")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=streams, thread_name_prefix="stream") as executor:
+        futures = [executor.submit(run_stream, run.job_id, connection_string, **stream_kwargs) for _ in range(streams)]
+        metrics = [metric for future in futures for metric in future.result()]
+    elapsed = time.perf_counter() - start
+
+    completed = sum(1 for m in metrics if m.status == STATUS_OK)
+    run.throughput_score = completed * 3600.0 / elapsed if elapsed > 0 else None
+    return metrics
+
+
+def fit_scaling_exponents(
+    metrics_by_scale: Dict[int, List[QueryMetric]],
+    superlinear_threshold: float = 1.1,
+) -> Dict[int, Tuple[float, float, bool]]:
+    """
+    Fits time = c * SF^k per query with a least-squares line in log-log space.
+    Returns {query_number: (k, r_squared, superlinear)} for every query with
+    completed runs at two or more scale factors.
+    """
+    medians: Dict[int, Dict[int, float]] = defaultdict(dict)
+    for scale_factor, metrics in metrics_by_scale.items():
+        per_query = defaultdict(list)
+        for m in metrics:
+            if m.status == STATUS_OK and m.execution_time_seconds > 0:
+                per_query[m.query_number].append(m.execution_time_seconds)
+        for query_number, times in per_query.items():
+            medians[query_number][scale_factor] = float(np.median(times))
+
+    fits = {}
+    for query_number, by_scale in sorted(medians.items()):
+        if len(by_scale) < 2:
+            continue
+        x = np.log(np.array(list(by_scale.keys()), dtype=float))
+        y = np.log(np.array(list(by_scale.values()), dtype=float))
+        slope, intercept = np.polyfit(x, y, 1)
+        residual = y - (slope * x + intercept)
+        total = np.sum((y - y.mean()) ** 2)
+        r_squared = 1.0 - np.sum(residual ** 2) / total if total > 0 else 1.0
+        fits[query_number] = (float(slope), float(r_squared), bool(slope > superlinear_threshold))
+    return fits
+
+
+def run_scale_sweep(
+    db_type: str,
+    connection_string: str,
+    scale_factors: Iterable[int],
+    loader: DatasetLoader,
+    stream_counts: Iterable[int] = (1,),
+    superlinear_threshold: float = 1.1,
+    sweep_id: Optional[uuid.UUID] = None,
+    save: bool = False,
+    **stream_kwargs,
+) -> Tuple[List[BenchmarkRun], List[QueryMetric], List[ScalingFit]]:
+    """
+    Runs one BenchmarkRun per (scale factor, stream count), smallest scale
+    factor first so the dataset only ever grows, and fits per-query scaling
+    exponents from the single-stream results (or the lowest stream count).
+    With save each run is written as soon as it is finished and the fits
+    once the sweep is done.
+    """
+    sweep_id = sweep_id or uuid.uuid4()
+    stream_counts = sorted(stream_counts)
+    if stream_counts[-1] > 1 and stream_kwargs.get("cache_state") == COLD:
+        raise ValueError("cache_state='cold' cannot be used with more than one stream.")
+
+    runs, all_metrics = [], []
+    fit_input: Dict[int, List[QueryMetric]] = {}
+    for scale_factor in sorted(scale_factors):
+        ensure_scale_factor(connection_string, scale_factor, loader)
+        # the loader may rebuild the tables, so read the layout per scale factor
+        layout = current_layout(connection_string)
+        for streams in stream_counts:
+            run = BenchmarkRun(
+                job_id=uuid.uuid4(),
+                db_type=db_type,
+                scale_factor=scale_factor,
+                status="running",
+                sweep_id=sweep_id,
+                streams=streams,
+                layout=layout,
+            )
+            metrics = run_concurrent_streams(run, connection_string, streams, **stream_kwargs)
+            finalize_run(run, metrics)
+            if save:
+                save_run(run, metrics)
+            runs.append(run)
+            all_metrics.extend(metrics)
+            if streams == stream_counts[0]:
+                fit_input[scale_factor] = metrics
+
+    fits = [
+        ScalingFit(
+            sweep_id=sweep_id,
+            db_type=db_type,
+            query_number=query_number,
+            exponent=exponent,
+            r_squared=r_squared,
+            superlinear=superlinear,
+            min_scale_factor=min(fit_input),
+            max_scale_factor=max(fit_input),
+        )
+        for query_number, (exponent, r_squared, superlinear)
+        in fit_scaling_exponents(fit_input, superlinear_threshold).items()
+    ]
+    if save:
+        save_rows(fits)
+    return runs, all_metrics, fits
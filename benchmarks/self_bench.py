@@ -0,0 +1,268 @@
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Benchmarks of the harness itself, run against local stand-ins only:
+#
+#     generator      lineitem_row rows/sec (the body of generate_lineitem_date)
+#     bulk_load      MB/sec of generated LineItem rows loaded into SQLite
+#                    through partitioning.load_batch
+#     query_overhead median microseconds a runner.run_query call spends
+#                    outside the query job, over many calls with a stub job
+#     metric_write   rows/sec recorded into a MetricBuffer and written to a
+#                    SQLite results DB with runner.save_buffered_run
+#
+# Results are compared with the stored baseline (self_bench_baseline.json);
+# a result that is worse than the baseline by more than the tolerance fails
+# the suite, and so does a missing baseline.
+#
+# The numbers are only comparable on the machine they were taken on, so the
+# baseline records a description of it (Python build, architecture, CPU
+# model and count) and the suite fails when run elsewhere. Before the suite
+# gates CI, record the baseline once on the CI host and commit it:
+#
+#     python -m benchmarks.self_bench [--update-baseline] [--tolerance 0.2]
+
+BASELINE_PATH = Path(__file__).with_name("self_bench_baseline.json")
+DEFAULT_TOLERANCE = 0.20
+SEED = 20240101
+
+GENERATOR_ROWS = 200_000
+LOAD_ROWS = 100_000
+LOAD_BATCH_ROWS = 10_000
+OVERHEAD_QUERIES = 20_000
+METRIC_ROWS = 50_000
+REPEATS = 3
+
+
+def _best(measure: Callable[[], float], higher_is_better: bool) -> float:
+    # best of a few repeats, which filters out noise from other processes
+    results = [measure() for _ in range(REPEATS)]
+    return max(results) if higher_is_better else min(results)
+
+
+def bench_generator() -> float:
+    from .benchmark_jobs import lineitem_row
+
+    def measure() -> float:
+        random.seed(SEED)
+        start = time.perf_counter()
+        for row_number in range(GENERATOR_ROWS):
+            lineitem_row(row_number)
+        return GENERATOR_ROWS / (time.perf_counter() - start)
+
+    return _best(measure, higher_is_better=True)
+
+
+@contextmanager
+def _sqlite_tpch_db():
+    """
+    Connection string of a temporary SQLite file with the TPC-H tables.
+    A file rather than an in-memory database because the harness opens a
+    new engine per call.
+    """
+    from sqlmodel import SQLModel, create_engine
+
+    from .tpch_schema import TPCH_MODELS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        connection_string = f"sqlite:///{tmp}/tpch.db"
+        engine = create_engine(connection_string)
+        SQLModel.metadata.create_all(engine, tables=[model.__table__ for model in TPCH_MODELS])
+        engine.dispose()
+        yield connection_string
+
+
+def _generated_rows(count: int) -> List[dict]:
+    from .benchmark_jobs import lineitem_row
+
+    random.seed(SEED)
+    rows = [lineitem_row(row_number) for row_number in range(count)]
+    # the generator draws order keys at random, keep the (orderkey, linenumber) key unique
+    for row_number, row in enumerate(rows):
+        row["l_orderkey"] = row_number // 4 + 1
+    return rows
+
+
+def bench_bulk_load() -> float:
+    from .partitioning import load_batch
+
+    rows = _generated_rows(LOAD_ROWS)
+    out = io.StringIO()
+    csv.writer(out).writerows(row.values() for row in rows)
+    megabytes = len(out.getvalue().encode()) / 1e6
+
+    def measure() -> float:
+        with _sqlite_tpch_db() as connection_string:
+            start = time.perf_counter()
+            for batch_start in range(0, LOAD_ROWS, LOAD_BATCH_ROWS):
+                load_batch(connection_string, "lineitem", rows[batch_start:batch_start + LOAD_BATCH_ROWS])
+            return megabytes / (time.perf_counter() - start)
+
+    return _best(measure, higher_is_better=True)
+
+
+def bench_query_overhead() -> float:
+    from .runner import run_query, stream_db_instance
+
+    job_id = uuid.uuid4()
+    # the job is timed on its own and subtracted call by call, so what it
+    # does doesn't matter and a trivial one keeps database noise out
+    job_seconds = []
+
+    def stub_job(db_instance):
+        start = time.perf_counter()
+        result = [(0.0,)]
+        job_seconds.append(time.perf_counter() - start)
+        return result
+
+    db_instance, application_name = stream_db_instance(job_id, "sqlite://")
+    overheads = []
+    for _ in range(OVERHEAD_QUERIES):
+        start = time.perf_counter()
+        run_query(job_id, 6, "sqlite://", job=stub_job, db_instance=db_instance, application_name=application_name)
+        overheads.append(time.perf_counter() - start - job_seconds[-1])
+    return statistics.median(overheads) * 1e6
+
+
+def bench_metric_write() -> float:
+    from sqlmodel import SQLModel, create_engine
+
+    from .metric_buffer import MetricBuffer
+    from .runner import save_buffered_run
+    from backend.result_models import RESULTS_DB_MODELS, BenchmarkRun
+
+    def measure() -> float:
+        with tempfile.TemporaryDirectory() as tmp:
+            results_url = f"sqlite:///{tmp}/results.db"
+            engine = create_engine(results_url)
+            SQLModel.metadata.create_all(engine, tables=[model.__table__ for model in RESULTS_DB_MODELS])
+            engine.dispose()
+
+            previous = os.environ.get("RESULTS_DB_URL")
+            os.environ["RESULTS_DB_URL"] = results_url
+            try:
+                run = BenchmarkRun(job_id=uuid.uuid4(), db_type="sqlite", scale_factor=1, status="completed")
+                start = time.perf_counter()
+                buffer = MetricBuffer()
+                now_ns = time.time_ns()
+                for i in range(METRIC_ROWS):
+                    buffer.record(i % 22 + 1, 0, now_ns + i * 1000, now_ns + i * 1000 + 500)
+                save_buffered_run(run, buffer)
+                return METRIC_ROWS / (time.perf_counter() - start)
+            finally:
+                if previous is None:
+                    os.environ.pop("RESULTS_DB_URL", None)
+                else:
+                    os.environ["RESULTS_DB_URL"] = previous
+
+    return _best(measure, higher_is_better=True)
+
+
+# name -> (function, unit, higher_is_better)
+BENCHMARKS = {
+    "generator": (bench_generator, "rows/s", True),
+    "bulk_load": (bench_bulk_load, "MB/s", True),
+    "query_overhead": (bench_query_overhead, "us/query", False),
+    "metric_write": (bench_metric_write, "rows/s", True),
+}
+
+
+# key of the machine description in the baseline file
+MACHINE_KEY = "machine"
+
+
+def machine_description() -> str:
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu = next(line.split(":", 1)[1].strip() for line in f if line.startswith("model name"))
+    except (OSError, StopIteration):
+        pass
+    return (f"{platform.python_implementation()} {platform.python_version()} "
+            f"{platform.system()} {platform.machine()}, {cpu} x{os.cpu_count()}")
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def check_regressions(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """
+    Names of the benchmarks that are worse than their baseline by more than
+    the tolerance.
+    """
+    failures = []
+    for name, value in results.items():
+        if name not in baseline:
+            continue
+        _, _, higher_is_better = BENCHMARKS[name]
+        if higher_is_better and value < baseline[name] * (1 - tolerance):
+            failures.append(name)
+        elif not higher_is_better and value > baseline[name] * (1 + tolerance):
+            failures.append(name)
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks.self_bench", description="Benchmarks of the harness itself")
+    parser.add_argument("benchmarks", nargs="*", metavar="NAME",
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        func, unit, _ = BENCHMARKS[name]
+        results[name] = func()
+        reference = f"  (baseline {baseline[name]:.2f})" if name in baseline else ""
+        print(f"{name:<16} {results[name]:12.2f} {unit}{reference}")
+
+    machine = machine_description()
+    if args.update_baseline:
+        # numbers from another machine can't be mixed with these
+        if baseline.get(MACHINE_KEY) != machine:
+            baseline = {}
+        baseline = {**baseline, **results, MACHINE_KEY: machine}
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if baseline and baseline.get(MACHINE_KEY) != machine:
+        print(f"baseline in {args.baseline} was recorded on {baseline.get(MACHINE_KEY, 'an unknown machine')}, "
+              f"not on this one ({machine}); run with --update-baseline here to record one", file=sys.stderr)
+        return 1
+
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f"no baseline for {', '.join(missing)} in {args.baseline}, run with --update-baseline to record one",
+              file=sys.stderr)
+        return 1
+    failures = check_regressions(results, baseline, args.tolerance)
+    for name in failures:
+        print(f"REGRESSION: {name} is more than {args.tolerance:.0%} worse than baseline", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+# Small numeric helpers shared by the workload generators and reports.
+
+
+def latency_percentiles(samples: Sequence[float], percentiles: Iterable[float] = (50, 95, 99)) -> Dict[str, Optional[float]]:
+    """
+    Returns {"p50": ..., "p95": ..., "p99": ...} for a list of latencies,
+    with None values when there are no samples.
+    """
+    percentiles = list(percentiles)
+    keys = [f"p{p:g}" for p in percentiles]
+    if len(samples) == 0:
+        return dict.fromkeys(keys)
+    values = np.percentile(np.asarray(samples, dtype=float), percentiles)
+    return {key: float(value) for key, value in zip(keys, values)}
+
+
+def geometric_mean(values: Iterable[float]) -> Optional[float]:
+    """
+    Geometric mean of the positive values, or None if there are none.
+    """
+    array = np.asarray([v for v in values if v > 0], dtype=float)
+    if array.size == 0:
+        return None
+    return float(np.exp(np.log(array).mean()))
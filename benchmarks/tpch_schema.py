@@ -1,22 +1,26 @@
 
 import datafruit as dft
-from sqlmodel import field, SQLModel
+from sqlmodel import Field, SQLModel, create_engine, text
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
 from typing import Optional
 from datetime import date
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 # This file defines the TPC-H benchmark schema
 # and a factory function to create a datafruit.PostgresDB instance for it.
 
 class Nation(SQLModel, table = True):
     __tablename__ = 'nation'
-    n_nationkey: int = Field(primary_key=true, description = "Nation Key")
+    n_nationkey: int = Field(primary_key=True, description = "Nation Key")
     n_name: str = Field(max_length=25, description = "Nation Name")
     n_regionkey: int = Field(foreign_key="region.r_regionkey", description  = "Region Key")
     n_comment: Optional[str] = Field(max_length = 152, description = "Comment")
 
 class Region(SQLModel, table = True):
     __tablename__ = 'region'
-    r_regionkey: int = Field(primary_key=true, description = "Region Key")
+    r_regionkey: int = Field(primary_key=True, description = "Region Key")
     r_name: str = Field(max_length=25, description = "Region Name")
     r_comment: Optional[str] = Field(max_length = 152, description = "Comment")
 
@@ -103,6 +107,125 @@ TPCH_MODELS = [
     LineItem,
 ]
 
+# physical layouts for the two large fact tables. "heap" is the plain layout
+# declared by the models above, "range_date" partitions lineitem by
+# l_shipdate and orders by o_orderdate into yearly ranges, "hash_orderkey"
+# hash-partitions both on their order key.
+HEAP = "heap"
+RANGE_BY_DATE = "range_date"
+HASH_BY_ORDERKEY = "hash_orderkey"
+LAYOUTS = (HEAP, RANGE_BY_DATE, HASH_BY_ORDERKEY)
+
+# table -> (range partition column, hash partition column)
+PARTITION_KEYS = {
+    "lineitem": ("l_shipdate", "l_orderkey"),
+    "orders": ("o_orderdate", "o_orderkey"),
+}
+# TPC-H dates (and the lineitem generator) span 1992-1998
+RANGE_PARTITION_YEARS = range(1992, 1999)
+HASH_PARTITION_COUNT = 8
+
+
+def partition_column(table_name: str, layout: str) -> str:
+    range_column, hash_column = PARTITION_KEYS[table_name]
+    return range_column if layout == RANGE_BY_DATE else hash_column
+
+
+def partition_names(table_name: str, layout: str) -> list:
+    """
+    Names of the child tables a partitioned table is split into.
+    """
+    if layout == RANGE_BY_DATE:
+        return [f"{table_name}_y{year}" for year in RANGE_PARTITION_YEARS] + [f"{table_name}_default"]
+    if layout == HASH_BY_ORDERKEY:
+        return [f"{table_name}_h{remainder}" for remainder in range(HASH_PARTITION_COUNT)]
+    return []
+
+
+def partition_key_type(table_name: str, layout: str) -> str:
+    """
+    SQL type of a table's partition key, e.g. for casting key arrays.
+    """
+    model = next(m for m in TPCH_MODELS if m.__tablename__ == table_name)
+    column = model.__table__.columns[partition_column(table_name, layout)]
+    return column.type.compile(dialect=postgresql.dialect())
+
+
+def current_layout(connection_string: str) -> str:
+    """
+    Reads the layout lineitem was created with from the catalog.
+    """
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.connect() as conn:
+            strategy = conn.execute(text(
+                "select partstrat from pg_partitioned_table where partrelid = to_regclass('lineitem')"
+            )).scalar()
+    finally:
+        engine.dispose()
+    return {"r": RANGE_BY_DATE, "h": HASH_BY_ORDERKEY}.get(strategy, HEAP)
+
+
+def partitioned_table(model, layout: str) -> Table:
+    """
+    Builds a partitioned variant of a model's table. Postgres requires the
+    partition key in the primary key, and foreign keys into a range-partitioned
+    orders table are not possible, so the copy declares no foreign keys.
+    """
+    key = partition_column(model.__tablename__, layout)
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key or c.name == key, nullable=c.nullable)
+        for c in model.__table__.columns
+    ]
+    strategy = "RANGE" if layout == RANGE_BY_DATE else "HASH"
+    return Table(model.__tablename__, MetaData(), *columns, postgresql_partition_by=f"{strategy} ({key})")
+
+
+def partition_ddl(table_name: str, layout: str) -> list:
+    """
+    CREATE TABLE ... PARTITION OF statements for every child table.
+    """
+    statements = []
+    if layout == RANGE_BY_DATE:
+        for year in RANGE_PARTITION_YEARS:
+            statements.append(
+                f"create table {table_name}_y{year} partition of {table_name} "
+                f"for values from ('{year}-01-01') to ('{year + 1}-01-01')"
+            )
+        statements.append(f"create table {table_name}_default partition of {table_name} default")
+    elif layout == HASH_BY_ORDERKEY:
+        for remainder in range(HASH_PARTITION_COUNT):
+            statements.append(
+                f"create table {table_name}_h{remainder} partition of {table_name} "
+                f"for values with (modulus {HASH_PARTITION_COUNT}, remainder {remainder})"
+            )
+    return statements
+
+
+def create_tpch_schema(connection_string: str, layout: str = HEAP) -> None:
+    """
+    Creates the TPC-H tables with the requested physical layout.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', expected one of {LAYOUTS}.")
+
+    engine = get_tpch_engine(connection_string)
+    try:
+        with engine.begin() as conn:
+            if layout == HEAP:
+                SQLModel.metadata.create_all(conn, tables=[m.__table__ for m in TPCH_MODELS])
+                return
+            plain = [m.__table__ for m in TPCH_MODELS if m.__tablename__ not in PARTITION_KEYS]
+            SQLModel.metadata.create_all(conn, tables=plain)
+            for model in TPCH_MODELS:
+                if model.__tablename__ in PARTITION_KEYS:
+                    conn.execute(CreateTable(partitioned_table(model, layout)))
+                    for statement in partition_ddl(model.__tablename__, layout):
+                        conn.exec_driver_sql(statement)
+    finally:
+        engine.dispose()
+
+
 def get_tpch_db_instance(connection_string: str) -> dft.PostgresDB:
     """
     Creates a datafruit.PostgresDB instance for a given
@@ -113,4 +236,30 @@ def get_tpch_db_instance(connection_string: str) -> dft.PostgresDB:
         connection_string=connection_string,
         tables=TPCH_MODELS
     )
-    return db
\ No newline at end of file
+    return db
+
+def get_tpch_engine(connection_string: str, **engine_kwargs):
+    """
+    Creates a plain SQLAlchemy engine for the TPC-H database, used by the
+    harness for control statements (cache management, stats sampling) that
+    are not themselves benchmarked queries.
+    """
+    return create_engine(connection_string, pool_pre_ping=True, **engine_kwargs)
+
+
+def with_session_settings(connection_string: str, **settings) -> str:
+    """
+    Returns the connection string with Postgres session settings applied at
+    connect time through the libpq `options` parameter, e.g.
+    with_session_settings(url, statement_timeout="30s").
+    `application_name` is passed as its own parameter.
+    """
+    parts = urlsplit(connection_string)
+    query = dict(parse_qsl(parts.query))
+    if "application_name" in settings:
+        query["application_name"] = settings.pop("application_name")
+    options = [query["options"]] if query.get("options") else []
+    options += [f"-c {name}={value}" for name, value in settings.items()]
+    if options:
+        query["options"] = " ".join(options)
+    return urlunsplit(parts._replace(query=urlencode(query)))
@@ -0,0 +1,68 @@
+import os
+import time
+import uuid
+
+import pytest
+
+pytest.importorskip("datafruit")
+
+from benchmarks import distributed
+from benchmarks.distributed import run_local
+from backend.result_models import BenchmarkRun
+
+# run_local spawns its workers, so the stub jobs are sent by reference and
+# have to live at module level
+
+
+def quick_job(db_instance):
+    time.sleep(0.01)
+    return [1, 2, 3]
+
+
+def crashing_job(db_instance):
+    os._exit(3)
+
+
+def hanging_job(db_instance):
+    time.sleep(60)
+
+
+@pytest.fixture(autouse=True)
+def short_start_delay(monkeypatch):
+    monkeypatch.setattr(distributed, "START_DELAY_SECONDS", 0.2)
+
+
+def _run() -> BenchmarkRun:
+    return BenchmarkRun(job_id=uuid.uuid4(), db_type="stub", scale_factor=1)
+
+
+def test_run_local_merges_all_streams():
+    run = _run()
+    buffer = run_local(
+        run, "sqlite://", workers=2, streams=3, iterations=2,
+        query_numbers=[1, 6], job_overrides={1: quick_job, 6: quick_job},
+    )
+    assert len(buffer) == 3 * 2 * 2
+    assert set(buffer.column("stream")) == {0, 1, 2}
+    assert set(buffer.column("rows")) == {3}
+    assert run.throughput_score > 0
+
+
+def test_run_local_raises_when_a_worker_dies():
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="disconnected|exited with code 3"):
+        run_local(
+            _run(), "sqlite://", workers=2, streams=2,
+            query_numbers=[1], job_overrides={1: crashing_job},
+        )
+    assert time.monotonic() - start < 10
+
+
+def test_run_local_gives_up_on_slow_results():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        run_local(
+            _run(), "sqlite://", workers=1, streams=1,
+            query_numbers=[1], job_overrides={1: hanging_job}, result_timeout_seconds=0.5,
+        )
+    assert time.monotonic() - start < 10